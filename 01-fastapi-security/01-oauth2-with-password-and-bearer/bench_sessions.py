@@ -0,0 +1,42 @@
+import os
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+from jose import jwt
+
+from session_store import InMemorySessionStore, SQLiteSessionStore
+
+# <요청 1건당 인증 조회 비용 비교>
+# - opaque session: 토큰으로 세션 레코드를 찾는다. (in-memory dict / SQLite)
+# - JWT: 02 앱의 get_current_user 처럼 매 요청 jwt.decode 로 서명을 검증한다.
+# - 둘 다 세션 / 토큰 1만 개를 만들어 두고 랜덤이 아닌 고정 토큰을 반복 조회한다.
+# 실행: python bench_sessions.py  (python-jose 필요)
+
+SECRET_KEY = "9a70a60a1f45fb791b64b49053dd482e4fbcfd821dc7c88952ab3ecce6199b2b"
+SESSIONS = 10_000
+
+
+def report(name: str, fn) -> None:
+    number, seconds = timeit.Timer(fn).autorange()
+    print(f"{name:<28} {seconds / number * 1_000_000:8.2f} us/lookup")
+
+
+def main() -> None:
+    memory_store = InMemorySessionStore()
+    memory_tokens = [memory_store.create(f"user{i}") for i in range(SESSIONS)]
+    report("session in-memory", lambda: memory_store.get(memory_tokens[SESSIONS // 2]))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sqlite_store = SQLiteSessionStore(os.path.join(tmp_dir, "sessions.db"))
+        sqlite_tokens = [sqlite_store.create(f"user{i}") for i in range(SESSIONS)]
+        report("session sqlite", lambda: sqlite_store.get(sqlite_tokens[SESSIONS // 2]))
+        sqlite_store.close()
+
+    claims = {"sub": "user1", "exp": datetime.utcnow() + timedelta(minutes=15)}
+    hs256_token = jwt.encode(claims, SECRET_KEY, algorithm="HS256")
+    report("jwt HS256 decode", lambda: jwt.decode(hs256_token, SECRET_KEY, algorithms="HS256"))
+
+
+if __name__ == "__main__":
+    main()
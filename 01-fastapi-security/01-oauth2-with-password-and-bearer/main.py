@@ -1,3 +1,4 @@
+import os
 from typing import Annotated
 
 import uvicorn
@@ -6,6 +7,15 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from starlette import status
 
+from session_store import InMemorySessionStore, SQLiteSessionStore
+
+# 세션 설정
+# - "memory": 워커 메모리에만 저장. 가장 빠르지만 재시작하면 세션이 사라진다.
+# - "sqlite": SESSION_DB_PATH 파일에 저장. 재시작해도 유지되고 같은 머신의 워커끼리 공유된다.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_TTL_SECONDS = 60 * 30
+
 app = FastAPI()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -46,6 +56,12 @@ fake_users_db = {
 }
 
 
+if SESSION_BACKEND == "sqlite":
+    session_store = SQLiteSessionStore(SESSION_DB_PATH, ttl_seconds=SESSION_TTL_SECONDS)
+else:
+    session_store = InMemorySessionStore(ttl_seconds=SESSION_TTL_SECONDS)
+
+
 # 가짜 hasehd password 생성
 def fake_hashed_password(password: str) -> str:
     return "fakehashed" + password
@@ -67,26 +83,37 @@ async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
         raise HTTPException(status_code=400, detail="Incorrect password")
 
     # Return token
-    return {"access_token": user.username,
+    # - username 대신 랜덤 세션 토큰을 발급한다. 토큰 -> 세션 레코드 매핑은 session_store 에 있다.
+    session_token = session_store.create(user.username)
+    return {"access_token": session_token,
             "token_type": "bearer"}
 
 
+@app.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: Annotated[str, Depends(oauth2_scheme)]):
+    # 세션을 지우면 같은 토큰은 바로 쓸 수 없게 된다.
+    session_store.delete(token)
+
+
 def get_user(db, username: str):
     if username in db:
         user_dict = db.get(username)
         return UserInDB(**user_dict)
 
 
-def fake_decode_token(token: str):
-    # User 를 fake db 에서 가져온다. token 은 username 을 담고있다.
-    user = get_user(fake_users_db, token)
+def decode_session_token(token: str):
+    # 세션 토큰으로 세션 레코드를 찾고, 레코드의 username 으로 User 를 fake db 에서 가져온다.
+    session = session_store.get(token)
+    if not session:
+        return None
+    user = get_user(fake_users_db, session.username)
     return user
 
 
 # oauth2_scheme 의 결과로 token 을 받아온다. oauth2_scheme 은 유저 요청을 parsing 해서 토큰을 가져온다.
 def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
-    # token 을 fake db 에 넣어서 유저 정보를 가져온다.
-    user = fake_decode_token(token)
+    # token 으로 세션을 찾아서 유저 정보를 가져온다.
+    user = decode_session_token(token)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Invalid authentication credentials",
@@ -0,0 +1,137 @@
+import hashlib
+import secrets
+import sqlite3
+import threading
+import time
+
+
+# 세션 레코드. 세션이 수십만 개여도 가볍도록 __dict__ 없이 slot 두 개만 가진다.
+class SessionRecord:
+    __slots__ = ("username", "expires_at")
+
+    def __init__(self, username: str, expires_at: float):
+        self.username = username
+        self.expires_at = expires_at
+
+
+def new_session_token() -> str:
+    # 256 bit 랜덤 토큰. 토큰 자체에는 아무 정보도 없다. (opaque)
+    return secrets.token_urlsafe(32)
+
+
+# <In-memory session store>
+# - token -> SessionRecord dict 라서 조회는 O(1) 이다.
+# - 만료 처리는 TTL wheel 로 한다.
+#   - 시간을 resolution 초 단위 tick 으로 나누고, 각 tick 마다 slot (token 집합) 을 하나 둔다.
+#   - 세션을 만들 때 만료 tick 의 slot 에 token 을 넣는다.
+#   - 시간이 지나면 지나간 tick 의 slot 만 비우면 되므로 전체 세션을 훑지 않아도 된다.
+# - 조회할 때도 expires_at 을 확인하므로 wheel 이 아직 돌지 않았어도 만료된 세션은 통과하지 못한다.
+class InMemorySessionStore:
+    def __init__(self, ttl_seconds: int = 1800, resolution_seconds: int = 1):
+        self.ttl_seconds = ttl_seconds
+        self.resolution_seconds = resolution_seconds
+        self._sessions: dict[str, SessionRecord] = {}
+        self._wheel: list[set[str]] = [set() for _ in range(ttl_seconds // resolution_seconds + 2)]
+        self._current_tick = self._tick(time.time())
+        self._lock = threading.Lock()
+
+    def _tick(self, timestamp: float) -> int:
+        return int(timestamp // self.resolution_seconds)
+
+    def _advance(self, now: float) -> None:
+        now_tick = self._tick(now)
+        # 한 바퀴 이상 밀렸으면 한 바퀴만 돌면 된다.
+        start_tick = max(self._current_tick, now_tick - len(self._wheel) + 1)
+        for tick in range(start_tick, now_tick + 1):
+            slot = self._wheel[tick % len(self._wheel)]
+            for token in slot:
+                record = self._sessions.get(token)
+                if record is not None and record.expires_at <= now:
+                    del self._sessions[token]
+            slot.clear()
+        self._current_tick = now_tick
+
+    def create(self, username: str) -> str:
+        token = new_session_token()
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._advance(now)
+            self._sessions[token] = SessionRecord(username, expires_at)
+            # 만료 시각이 속한 tick 이 끝난 다음 tick 에 정리되도록 +1 tick 위치에 넣는다.
+            self._wheel[(self._tick(expires_at) + 1) % len(self._wheel)].add(token)
+        return token
+
+    def get(self, token: str) -> SessionRecord | None:
+        now = time.time()
+        if self._tick(now) != self._current_tick:
+            with self._lock:
+                self._advance(now)
+
+        record = self._sessions.get(token)
+        if record is None or record.expires_at <= now:
+            return None
+        return record
+
+    def delete(self, token: str) -> None:
+        with self._lock:
+            # wheel 의 slot 에 남은 token 은 그 tick 이 올 때 그냥 무시된다.
+            self._sessions.pop(token, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+# <SQLite session store>
+# - 프로세스가 재시작돼도 세션이 유지된다. 같은 파일을 쓰면 한 머신의 여러 워커가 세션을 공유한다.
+# - DB 에는 token 원문 대신 sha256 digest 를 저장한다. DB 파일이 유출돼도 세션을 탈취할 수 없다.
+# - token_hash 가 PRIMARY KEY 인 WITHOUT ROWID 테이블이라서 조회는 B-tree 한 번이다.
+# - 만료된 세션은 일정 간격으로 한 번에 지운다. (expires_at 인덱스)
+class SQLiteSessionStore:
+    def __init__(self, path: str = "sessions.db", ttl_seconds: int = 1800, purge_interval_seconds: int = 60):
+        self.ttl_seconds = ttl_seconds
+        self.purge_interval_seconds = purge_interval_seconds
+        self._next_purge_at = 0.0
+        self._lock = threading.Lock()
+
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " token_hash BLOB PRIMARY KEY,"
+            " username TEXT NOT NULL,"
+            " expires_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)")
+
+    @staticmethod
+    def _hash(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def create(self, username: str) -> str:
+        token = new_session_token()
+        now = time.time()
+        with self._lock:
+            if now >= self._next_purge_at:
+                self._connection.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+                self._next_purge_at = now + self.purge_interval_seconds
+            self._connection.execute("INSERT INTO sessions (token_hash, username, expires_at) VALUES (?, ?, ?)",
+                                     (self._hash(token), username, now + self.ttl_seconds))
+        return token
+
+    def get(self, token: str) -> SessionRecord | None:
+        with self._lock:
+            row = self._connection.execute("SELECT username, expires_at FROM sessions WHERE token_hash = ?",
+                                           (self._hash(token),)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return SessionRecord(row[0], row[1])
+
+    def delete(self, token: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM sessions WHERE token_hash = ?", (self._hash(token),))
+
+    def close(self) -> None:
+        self._connection.close()
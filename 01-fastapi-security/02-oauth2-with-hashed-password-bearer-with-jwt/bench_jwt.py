@@ -0,0 +1,56 @@
+import timeit
+from datetime import datetime, timedelta
+
+from jose import jwt
+
+from key_ring import KeyRing, generate_private_key_pem
+
+# <JWT sign / verify 마이크로 벤치마크>
+# - 기존 경로: jwt.encode / jwt.decode 에 SECRET_KEY 문자열을 넘긴다. (HS256, 매번 키 파싱)
+# - key ring 경로: 시작할 때 파싱해 둔 Key 객체로 서명 / 검증한다.
+# - "pem" 항목은 비대칭 키를 PEM 문자열 그대로 넘겼을 때의 비용이다. (키 객체 캐시의 효과)
+# 실행: python bench_jwt.py
+
+SECRET_KEY = "9a70a60a1f45fb791b64b49053dd482e4fbcfd821dc7c88952ab3ecce6199b2b"
+
+
+def claims() -> dict:
+    return {"sub": "johndoe", "exp": datetime.utcnow() + timedelta(minutes=15)}
+
+
+def ops_per_second(fn) -> float:
+    # 0.2 초 이상 걸리도록 반복 횟수를 자동으로 늘린다. (느린 RS256 pem 서명도 금방 끝나도록)
+    number, seconds = timeit.Timer(fn).autorange()
+    return number / seconds
+
+
+def report(name: str, sign, verify) -> None:
+    token = sign()
+    sign_ops = ops_per_second(sign)
+    verify_ops = ops_per_second(lambda: verify(token))
+    print(f"{name:<22} sign {sign_ops:>10.0f} ops/s   verify {verify_ops:>10.0f} ops/s")
+
+
+def main() -> None:
+    report("HS256 legacy",
+           lambda: jwt.encode(claims(), SECRET_KEY, algorithm="HS256"),
+           lambda token: jwt.decode(token, SECRET_KEY, algorithms="HS256"))
+
+    hs_ring = KeyRing()
+    hs_ring.add("hs256", "HS256", SECRET_KEY)
+    report("HS256 key ring", lambda: hs_ring.sign(claims()), hs_ring.verify)
+
+    for algorithm in ("RS256", "ES256"):
+        pem = generate_private_key_pem(algorithm)
+        key_ring = KeyRing()
+        signing_key = key_ring.add("bench", algorithm, pem)
+        public_pem = signing_key.verifying_key.to_pem()
+
+        report(f"{algorithm} key ring", lambda: key_ring.sign(claims()), key_ring.verify)
+        report(f"{algorithm} pem",
+               lambda: jwt.encode(claims(), pem.decode(), algorithm=algorithm),
+               lambda token: jwt.decode(token, public_pem.decode(), algorithms=algorithm))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import statistics
+import time
+
+from passlib.context import CryptContext
+from passlib.hash import argon2
+
+# <패스워드 해시 비용 보정 (calibration)>
+# - bcrypt / argon2 의 비용 파라미터를 이 머신에서 직접 측정해서, 목표 verify 지연시간 안에 들어오는 가장 강한 설정을 고른다.
+# - 결과는 CryptContext 설정 파일 (ini) 로 저장되고 main.py 가 시작할 때 읽는다. (CRYPT_CONTEXT_CONFIG)
+# - 기본 scheme 이 아닌 hash, 또는 비용이 낮은 hash 는 로그인에 성공할 때 새 설정으로 다시 해싱된다. (rehash-on-login)
+# 실행: python calibrate_password_hash.py --target-ms 250 --output crypt_context.ini
+
+BCRYPT_ROUNDS = range(10, 17)
+# (time_cost, memory_cost KiB) 후보. 약한 것 -> 강한 것 순서
+ARGON2_PARAMETERS = [(2, 19456), (2, 47104), (3, 65536), (4, 65536), (3, 131072), (4, 131072), (6, 262144)]
+SAMPLE_PASSWORD = "correct horse battery staple"
+
+
+def measure_verify_ms(context: CryptContext, samples: int) -> float:
+    hashed = context.hash(SAMPLE_PASSWORD)
+    timings = []
+    for _ in range(samples):
+        started_at = time.perf_counter()
+        context.verify(SAMPLE_PASSWORD, hashed)
+        timings.append((time.perf_counter() - started_at) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate_bcrypt(target_ms: float, samples: int) -> int | None:
+    chosen = None
+    for rounds in BCRYPT_ROUNDS:
+        verify_ms = measure_verify_ms(CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds), samples)
+        print(f"bcrypt rounds={rounds:<2}                       verify {verify_ms:8.1f} ms")
+        if verify_ms > target_ms:
+            # rounds 가 1 오르면 시간이 2배가 되므로 더 볼 필요가 없다.
+            break
+        chosen = rounds
+    return chosen
+
+
+def calibrate_argon2(target_ms: float, samples: int, parallelism: int) -> tuple[int, int] | None:
+    if not argon2.has_backend():
+        print("argon2 backend (argon2-cffi) 가 없어서 건너뜁니다.")
+        return None
+
+    chosen = None
+    for time_cost, memory_cost in ARGON2_PARAMETERS:
+        context = CryptContext(schemes=["argon2"], argon2__time_cost=time_cost,
+                               argon2__memory_cost=memory_cost, argon2__parallelism=parallelism)
+        verify_ms = measure_verify_ms(context, samples)
+        print(f"argon2 time_cost={time_cost} memory_cost={memory_cost:<6}  verify {verify_ms:8.1f} ms")
+        if verify_ms > target_ms:
+            break
+        chosen = (time_cost, memory_cost)
+    return chosen
+
+
+def build_context(bcrypt_rounds: int | None, argon2_params: tuple[int, int] | None, parallelism: int) -> CryptContext:
+    # argon2 가 있으면 기본 scheme 으로 쓰고, 기존 bcrypt hash 는 검증만 하다가 로그인할 때 argon2 로 바꾼다.
+    schemes = ["argon2", "bcrypt"] if argon2_params else ["bcrypt"]
+    settings = {"schemes": schemes, "default": schemes[0], "deprecated": "auto"}
+    if bcrypt_rounds:
+        # min_rounds 보다 낮은 bcrypt hash 는 needs_update() 가 True 가 된다.
+        settings.update({"bcrypt__rounds": bcrypt_rounds, "bcrypt__min_rounds": bcrypt_rounds})
+    if argon2_params:
+        time_cost, memory_cost = argon2_params
+        settings.update({"argon2__time_cost": time_cost,
+                         "argon2__memory_cost": memory_cost,
+                         "argon2__parallelism": parallelism})
+    return CryptContext(**settings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Calibrate password hash cost for this machine")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="verify 1회의 목표 지연시간 (median)")
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--parallelism", type=int, default=1, help="argon2 lanes. 풀 워커 수만큼 코어를 나눠 쓴다.")
+    parser.add_argument("--output", default="crypt_context.ini")
+    args = parser.parse_args()
+
+    bcrypt_rounds = calibrate_bcrypt(args.target_ms, args.samples)
+    argon2_params = calibrate_argon2(args.target_ms, args.samples, args.parallelism)
+    if bcrypt_rounds is None and argon2_params is None:
+        raise SystemExit(f"{args.target_ms}ms 안에 들어오는 설정이 없습니다. --target-ms 를 늘려주세요.")
+
+    context = build_context(bcrypt_rounds, argon2_params, args.parallelism)
+    with open(args.output, "w") as config_file:
+        config_file.write(context.to_string())
+    print(f"\n{args.output} 저장:\n{context.to_string()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import hashlib
+import json
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk, jwt, JWTError
+from jose.backends.base import Key
+
+# python-jose 는 EdDSA (Ed25519) 를 지원하지 않는다. 타원곡선 서명이 필요하면 ES256 을 쓴다.
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+SYMMETRIC_ALGORITHMS = ("HS256",)
+
+
+def generate_private_key_pem(algorithm: str) -> bytes:
+    # 개발용 키 생성. 운영에서는 JWT_KEYS_DIR 에 미리 만들어 둔 키를 넣어준다.
+    if algorithm == "RS256":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        raise ValueError(f"Cannot generate a key for {algorithm}")
+
+    return private_key.private_bytes(encoding=serialization.Encoding.PEM,
+                                     format=serialization.PrivateFormat.PKCS8,
+                                     encryption_algorithm=serialization.NoEncryption())
+
+
+class SigningKey:
+    __slots__ = ("kid", "algorithm", "signing_key", "verifying_key")
+
+    def __init__(self, kid: str, algorithm: str, key_material: str | bytes):
+        self.kid = kid
+        self.algorithm = algorithm
+        # PEM / secret 은 여기서 한 번만 파싱해서 Key 객체로 들고 있는다.
+        # jose 는 문자열 key 를 받으면 encode / decode 할 때마다 jwk.construct 로 다시 파싱한다.
+        self.signing_key: Key = jwk.construct(key_material, algorithm)
+        if algorithm in ASYMMETRIC_ALGORITHMS:
+            self.verifying_key: Key = self.signing_key.public_key()
+        else:
+            self.verifying_key: Key = self.signing_key
+
+    def to_public_jwk(self) -> dict:
+        public_jwk = self.verifying_key.to_dict()
+        public_jwk.update({"kid": self.kid, "use": "sig", "alg": self.algorithm})
+        return public_jwk
+
+
+# <Key ring>
+# - 서명용 키 (active) 는 하나지만, 검증용 키는 여러 개를 동시에 들고 있는다.
+# - 토큰 헤더의 'kid' 로 어떤 키로 검증할지 고른다.
+# - 키 교체 (rotation) 순서
+#   1) 새 키를 add() 한다. -> JWKS 에 먼저 공개되므로 다운스트림이 새 공개키를 캐시할 시간이 생긴다.
+#   2) activate() 로 새 키로 서명을 시작한다. 이전 키로 서명된 토큰도 아직 검증된다.
+#   3) 이전 키로 서명된 토큰이 모두 만료되면 retire() 한다.
+# - 대칭키 (HS256) 는 비밀키라서 JWKS 에 공개하지 않는다.
+class KeyRing:
+    def __init__(self):
+        self._keys: dict[str, SigningKey] = {}
+        self.active_kid: str | None = None
+        self._jwks_body: bytes | None = None
+
+    def add(self, kid: str, algorithm: str, key_material: str | bytes, activate: bool = False) -> SigningKey:
+        if algorithm not in ASYMMETRIC_ALGORITHMS + SYMMETRIC_ALGORITHMS:
+            raise ValueError(f"Unsupported algorithm: {algorithm}")
+
+        key = SigningKey(kid, algorithm, key_material)
+        self._keys[kid] = key
+        self._jwks_body = None
+        if activate or self.active_kid is None:
+            self.active_kid = kid
+        return key
+
+    def activate(self, kid: str) -> None:
+        if kid not in self._keys:
+            raise KeyError(kid)
+        self.active_kid = kid
+
+    def retire(self, kid: str) -> None:
+        if kid == self.active_kid:
+            raise ValueError("Cannot retire the active signing key")
+        self._keys.pop(kid, None)
+        self._jwks_body = None
+
+    @property
+    def active_key(self) -> SigningKey:
+        return self._keys[self.active_kid]
+
+    def sign(self, claims: dict) -> str:
+        key = self.active_key
+        return jwt.encode(claims, key.signing_key, algorithm=key.algorithm, headers={"kid": key.kid})
+
+    def verify(self, token: str) -> dict:
+        # 서명 검증 전에 헤더만 읽어서 kid 를 확인한다. 모르는 kid 는 바로 거절한다.
+        # kid 는 헤더에 있는 값 그대로라서 문자열이 아닐 수도 있다. (e.g. list 는 dict key 로 쓸 수 없다)
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self._keys.get(kid) if isinstance(kid, str) else None
+        if key is None:
+            raise JWTError("Unknown key id")
+        return jwt.decode(token, key.verifying_key, algorithms=[key.algorithm])
+
+    def jwks(self) -> dict:
+        keys = [key.to_public_jwk() for key in self._keys.values() if key.algorithm in ASYMMETRIC_ALGORITHMS]
+        return {"keys": keys}
+
+    def jwks_body(self) -> bytes:
+        # 키가 바뀔 때만 다시 직렬화한다.
+        if self._jwks_body is None:
+            self._jwks_body = json.dumps(self.jwks(), separators=(",", ":")).encode()
+        return self._jwks_body
+
+    def jwks_etag(self) -> str:
+        return '"' + hashlib.sha256(self.jwks_body()).hexdigest()[:32] + '"'
+
+    @classmethod
+    def from_directory(cls, keys_dir: str | Path, algorithm: str, active_kid: str | None = None) -> "KeyRing":
+        # '<kid>.pem' 파일들을 모두 읽는다. active_kid 가 없으면 이름순으로 마지막 키로 서명한다.
+        # e.g.) 2024-01.pem, 2024-02.pem -> 2024-02 로 서명, 2024-01 은 검증만
+        key_ring = cls()
+        pem_paths = sorted(Path(keys_dir).glob("*.pem"))
+        for pem_path in pem_paths:
+            key_ring.add(pem_path.stem, algorithm, pem_path.read_bytes())
+
+        if not pem_paths:
+            raise ValueError(f"No *.pem keys found in {keys_dir}")
+        key_ring.activate(active_kid or pem_paths[-1].stem)
+        return key_ring
@@ -1,18 +1,61 @@
+import os
+import secrets
+from contextlib import asynccontextmanager
 from datetime import timedelta, datetime
 from typing import Annotated
 
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import jwt, JWTError
+from jose import JWTError
 from passlib.context import CryptContext
 from pydantic import BaseModel
 from starlette import status
 
+from key_ring import KeyRing, generate_private_key_pem
+from password_pool import PasswordHashPool, PasswordPoolSaturated
+from rate_limit import LoginRateLimit, RateLimitBackend, RedisBackend, ShardedMemoryBackend
+from revocation import RevocationList
+from token_cache import VerifiedTokenCache
+
 # JWT 관련 기본 설정
+# - ALGORITHM 이 HS256 일 때만 SECRET_KEY 를 쓴다. RS256 / ES256 은 JWT_KEYS_DIR 의 '<kid>.pem' 키로 서명한다.
+# - JWT_KEYS_DIR 를 주면 RS256 이 기본값이고, 없으면 HS256 이 기본값이다.
+# - JWT_DEV_EPHEMERAL_KEY: 키 디렉토리 없이 RS256 / ES256 을 쓸 때 프로세스 안에서 임시 키를 만든다. (개발용, 워커 1개)
 SECRET_KEY = "9a70a60a1f45fb791b64b49053dd482e4fbcfd821dc7c88952ab3ecce6199b2b"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 1 DAY
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR")
+ALGORITHM = os.getenv("JWT_ALGORITHM", "RS256" if JWT_KEYS_DIR else "HS256")
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID")
+JWT_DEV_EPHEMERAL_KEY = os.getenv("JWT_DEV_EPHEMERAL_KEY", "false").lower() == "true"
+JWKS_MAX_AGE_SECONDS = 300
+# - 액세스 토큰은 짧게 발급하고, 만료되면 refresh token 으로 다시 받는다. (bcrypt 로그인 없이)
+ACCESS_TOKEN_EXPIRE_MINUTES = 15
+REFRESH_TOKEN_EXPIRE_DAYS = 7
+# 한 번의 로그인으로 refresh 를 계속 이어갈 수 있는 최대 기간
+REFRESH_TOKEN_FAMILY_EXPIRE_DAYS = 30
+
+# Claims-only 모드
+# - 토큰에 유저 정보 (email, full_name, disabled) 를 서명된 claim 으로 넣어서 요청마다 유저 조회를 하지 않는다.
+# - 토큰이 발급된 뒤 계정 정보가 바뀌어도 토큰은 그대로이므로 유효기간을 짧게 가져간다.
+CLAIMS_ONLY_AUTH = os.getenv("CLAIMS_ONLY_AUTH", "false").lower() == "true"
+CLAIMS_ONLY_TOKEN_EXPIRE_MINUTES = 5
+
+# 검증된 토큰 캐시 최대 엔트리 수
+TOKEN_CACHE_MAXSIZE = 10_000
+
+# calibrate_password_hash.py 로 만든 CryptContext 설정 파일
+CRYPT_CONTEXT_CONFIG = os.getenv("CRYPT_CONTEXT_CONFIG", "crypt_context.ini")
+
+# 패스워드 해싱 풀 설정 ("thread" 또는 "process")
+PASSWORD_POOL_KIND = os.getenv("PASSWORD_POOL_KIND", "thread")
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", "2"))
+PASSWORD_POOL_MAX_QUEUE = int(os.getenv("PASSWORD_POOL_MAX_QUEUE", "64"))
+
+# 로그인 rate limit: (초당 채워지는 시도 횟수, 최대 burst)
+LOGIN_RATE_LIMIT_PER_USER = (5 / 60, 5)  # 계정당 분당 5회
+LOGIN_RATE_LIMIT_PER_IP = (30 / 60, 30)  # IP 당 분당 30회
+# 설정하면 워커들이 Redis 에 있는 버킷을 공유한다.
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
 
 # Fake DB 데이터 생성
 fake_users_db = {
@@ -27,10 +70,27 @@ fake_users_db = {
 }
 
 
+# 유저별 epoch
+# - 계정 정보가 바뀌면 (비활성화, 이메일 변경 등) bump_user_epoch() 로 올린다.
+# - 토큰의 'ver' claim 이 현재 epoch 와 다르면 claim 을 믿지 않고 유저를 다시 조회한다.
+# - 프로세스 메모리에 있는 작은 dict 라서 조회 비용이 거의 없다. 여러 워커라면 변경 이벤트를 받아서 갱신해 준다.
+user_epochs: dict[str, int] = {}
+
+
+def get_user_epoch(username: str) -> int:
+    return user_epochs.get(username, 0)
+
+
+def bump_user_epoch(username: str) -> int:
+    user_epochs[username] = get_user_epoch(username) + 1
+    return user_epochs[username]
+
+
 # 토큰 response 스키마
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
 
 
 # 토큰 데이터 스키마
@@ -52,11 +112,76 @@ class UserInDB(User):
 
 
 # Password scheme 생성
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# - 보정된 설정 파일이 있으면 그걸 쓰고, 없으면 라이브러리 기본값을 쓴다.
+if os.path.exists(CRYPT_CONTEXT_CONFIG):
+    pwd_context = CryptContext.from_path(CRYPT_CONTEXT_CONFIG)
+else:
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def build_key_ring() -> KeyRing:
+    if ALGORITHM == "HS256":
+        key_ring = KeyRing()
+        key_ring.add("hs256", ALGORITHM, SECRET_KEY)
+        return key_ring
+    if JWT_KEYS_DIR:
+        return KeyRing.from_directory(JWT_KEYS_DIR, ALGORITHM, JWT_ACTIVE_KID)
+
+    # 키 디렉토리가 없으면 개발용 임시 키를 만든다. 명시적으로 켰을 때만
+    # - 프로세스마다 키가 달라지므로 재시작하거나 워커가 여러 개면 다른 워커가 발급한 토큰은 검증되지 않는다.
+    if not JWT_DEV_EPHEMERAL_KEY:
+        raise RuntimeError(f"JWT_ALGORITHM={ALGORITHM} requires JWT_KEYS_DIR "
+                           "(or JWT_DEV_EPHEMERAL_KEY=true for a single-process dev server)")
+    key_ring = KeyRing()
+    key_ring.add("dev", ALGORITHM, generate_private_key_pem(ALGORITHM))
+    return key_ring
+
+
+# 서명 / 검증 키는 시작할 때 한 번만 파싱한다.
+key_ring = build_key_ring()
+
+# bcrypt 는 이벤트 루프 밖의 전용 풀에서 실행한다.
+password_pool = PasswordHashPool(pwd_context,
+                                 kind=PASSWORD_POOL_KIND,
+                                 workers=PASSWORD_POOL_WORKERS,
+                                 max_queue=PASSWORD_POOL_MAX_QUEUE)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    password_pool.start()
+    yield
+    password_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+token_cache = VerifiedTokenCache(maxsize=TOKEN_CACHE_MAXSIZE)
+
+
+def build_rate_limit_backend() -> RateLimitBackend:
+    if RATE_LIMIT_REDIS_URL:
+        # redis 패키지는 공유 저장소를 쓸 때만 필요하다.
+        from redis import asyncio as redis_asyncio
+        return RedisBackend(redis_asyncio.from_url(RATE_LIMIT_REDIS_URL))
+    return ShardedMemoryBackend()
+
+
+login_rate_limit = LoginRateLimit(build_rate_limit_backend(),
+                                  per_user=LOGIN_RATE_LIMIT_PER_USER,
+                                  per_ip=LOGIN_RATE_LIMIT_PER_IP)
+
+# 폐기된 토큰 (logout, 사용된 refresh token) 의 jti 목록
+# - 액세스 토큰은 수명이 짧으므로 1시간 버킷
+# - refresh token (7일) / family (최대 30일) 는 exp 가 넓게 퍼지므로 1일 버킷
+revocation_list = RevocationList(bucket_seconds=3600)
+refresh_revocation_list = RevocationList(bucket_seconds=86400)
+
+
+def revocation_list_for(payload: dict) -> RevocationList:
+    return refresh_revocation_list if payload.get("typ") == "refresh" else revocation_list
 
 
 def get_user(db, username) -> UserInDB:
@@ -66,24 +191,32 @@ def get_user(db, username) -> UserInDB:
         return UserInDB(**user_dict)
 
 
-def verify_password(plain_password, hashed_password) -> bool:
+async def verify_password(plain_password, hashed_password) -> bool:
     # DB 의 hashed password 를 unhash 한 후 plain password 와 비교
-    return pwd_context.verify(plain_password, hashed_password)
+    # - bcrypt 는 CPU 를 오래 쓰므로 이벤트 루프를 막지 않도록 password_pool 에서 실행한다.
+    return await password_pool.verify(plain_password, hashed_password)
 
 
-def authenticate_user(fake_db, username: str, password: str) -> UserInDB | bool:
+async def authenticate_user(fake_db, username: str, password: str) -> UserInDB | bool:
     # 유저 DB 존재여부 확인
     user = get_user(fake_db, username)
 
     # 유저가 존재하고 패스워드도 일치할 경우만 return 'True'. 그 외는 return 'False' 한다.
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await password_pool.verify_and_update(password, user.hashed_password)
+    if not verified:
         return False
+
+    # <Rehash-on-login>
+    # - 평문 패스워드는 로그인 성공 시에만 알 수 있으므로 이때 오래된 scheme / 비용의 hash 를 새 설정으로 바꿔 저장한다.
+    if new_hash:
+        fake_db[username]["hashed_password"] = new_hash
+        user.hashed_password = new_hash
     return user
 
 
-def create_access_token(data: dict, expires_delta: timedelta | None) -> str:
+def create_access_token(data: dict, expires_delta: timedelta | None, user: User | None = None) -> str:
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -92,35 +225,104 @@ def create_access_token(data: dict, expires_delta: timedelta | None) -> str:
     # 'data' 와 'expires_delta' 를 가지고 액세스 토큰을 생성한다.
     # 아래 코드에서 shallow copy 를 한 후 to_encode.update() 를 하면 원본 'data' dict 내용도 바뀌어야 할 것 같은데 바뀌지 않음. 이유는?
     to_encode = data.copy()
-    to_encode.update({"exp": expire})
-
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # 'jti' 는 토큰마다 다른 id 다. 토큰을 폐기할 때 이 값을 폐기 목록에 넣는다.
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16)})
+
+    # Claims-only 모드: get_current_active_user 가 필요로 하는 필드를 서명된 claim 으로 넣는다.
+    if user:
+        to_encode.update({
+            "usr": user.model_dump(include={"email", "full_name", "disabled"}),
+            "ver": get_user_epoch(user.username),
+        })
+
+    # 헤더에 'kid' 를 넣어서 검증하는 쪽이 어떤 키를 써야 하는지 알 수 있게 한다.
+    encoded_jwt = key_ring.sign(to_encode)
     return encoded_jwt
 
 
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> UserInDB:
+def create_refresh_token(username: str, family: str | None = None, family_exp: int | None = None) -> str:
+    # <Refresh token rotation>
+    # - refresh token 은 한 번 쓰면 폐기하고 새 refresh token 을 준다.
+    # - 같은 로그인에서 이어진 refresh token 들은 같은 'fam' 과 'fexp' (family 의 최대 만료시각) 를 가진다.
+    #   이미 쓴 refresh token 이 다시 들어오면 탈취된 것으로 보고 fam 전체를 폐기한다.
+    now = datetime.utcnow()
+    if family is None:
+        family = secrets.token_urlsafe(16)
+        family_exp = int((now + timedelta(days=REFRESH_TOKEN_FAMILY_EXPIRE_DAYS)).timestamp())
+
+    expire = min(now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS), datetime.utcfromtimestamp(family_exp))
+    to_encode = {
+        "sub": username,
+        "typ": "refresh",
+        "fam": family,
+        "fexp": family_exp,
+        "exp": expire,
+        "jti": secrets.token_urlsafe(16),
+    }
+    return key_ring.sign(to_encode)
+
+
+def issue_tokens(user: User, family: str | None = None, family_exp: int | None = None) -> dict[str, str]:
+    # 액세스 토큰 발급
+    if CLAIMS_ONLY_AUTH:
+        access_token_expires = timedelta(minutes=CLAIMS_ONLY_TOKEN_EXPIRE_MINUTES)
+        access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires,
+                                           user=user)
+    else:
+        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
+
+    refresh_token = create_refresh_token(user.username, family, family_exp)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+def resolve_user(payload: dict) -> User | None:
+    username: str = payload["sub"]
+    user_claims: dict | None = payload.get("usr")
+
+    # 서명된 claim 이 있고 epoch 도 같으면 저장소를 조회하지 않고 claim 으로 유저를 만든다.
+    if user_claims is not None and payload.get("ver") == get_user_epoch(username):
+        return User(username=username, **user_claims)
+
+    # 토큰에서 가져온 username 으로 DB 에서 유저 정보를 가져온다.
+    return get_user(fake_users_db, username)
+
+
+def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> User:
     credential_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="토큰에서 인증 정보를 찾을 수 없습니다.",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    try:
-        # 토큰을 디코드 한 후 username 을 가져온다.
-        payload: dict = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHM)
-        username: str = payload.get("sub")
-        if username is None:
-            raise credential_exception
-    except JWTError:
-        raise credential_exception
+    # 이미 검증한 토큰이면 서명 검증과 유저 조회를 건너뛴다.
+    # - 캐시에 넣은 뒤 계정이 바뀌었으면 (epoch 가 다르면) 서명 검증만 건너뛰고 유저는 다시 확인한다.
+    cached = token_cache.get(token)
+    if cached:
+        payload, (epoch, user) = cached
     else:
-        # 토큰에서 가져온 username 으로 DB 에서 유저 정보를 가져온다.
-        user: UserInDB = get_user(fake_users_db, username)
-        if not user:
+        try:
+            # 토큰을 디코드 한 후 username 을 가져온다.
+            payload: dict = key_ring.verify(token)
+        except JWTError:
             raise credential_exception
+        # refresh token 은 액세스 토큰으로 쓸 수 없다.
+        if payload.get("sub") is None or payload.get("typ") == "refresh":
+            raise credential_exception
+
+    # 폐기 목록 확인. 캐시 hit 이어도 확인해야 logout 한 토큰이 바로 막힌다.
+    if revocation_list.is_revoked(payload.get("jti"), payload["exp"]):
+        raise credential_exception
+    if cached and epoch == get_user_epoch(payload["sub"]):
         return user
 
+    epoch = get_user_epoch(payload["sub"])
+    user = resolve_user(payload)
     # Exception 을 추가한다. (유저가 없는경우 / 토큰에 유저 데이터가 없는 경우)
+    if not user:
+        raise credential_exception
+    token_cache.set(token, payload, (epoch, user))
+    return user
 
 
 def get_current_active_user(current_user: Annotated[User, Depends(get_current_user)]) -> User:
@@ -132,19 +334,68 @@ def get_current_active_user(current_user: Annotated[User, Depends(get_current_us
 
 
 # 토큰 라우터
-@app.post("/token", response_model=Token)
+# bcrypt 검증 전에 rate limit 부터 확인한다.
+@app.post("/token", response_model=Token, dependencies=[Depends(login_rate_limit)])
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> dict[str, str]:
     # 유저 존재여부 확인 (Authentication)
-    user = authenticate_user(fake_users_db, form_data.username, form_data.password)
+    try:
+        user = await authenticate_user(fake_users_db, form_data.username, form_data.password)
+    except PasswordPoolSaturated:
+        # 해싱 풀 대기열이 꽉 찼으면 바로 거절한다. 다른 요청의 지연시간을 지키기 위함이다.
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="로그인 요청이 많습니다. 잠시 후 다시 시도해 주세요.",
+                            headers={"Retry-After": "1"})
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="유저의 이름 또는 유저의 비밀번호가 틀렸습니다.",
                             headers={"WWW_Authenticate": "Bearer"}, )
 
-    # 액세스 토큰 발급
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
-    return {"access_token": access_token, "token_type": "bearer"}
+    return issue_tokens(user)
+
+
+@app.post("/token/refresh", response_model=Token)
+async def refresh_access_token(refresh_token: Annotated[str, Form()]) -> dict[str, str]:
+    credential_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="유효하지 않은 refresh token 입니다.",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    try:
+        payload: dict = key_ring.verify(refresh_token)
+    except JWTError:
+        raise credential_exception
+    if payload.get("typ") != "refresh":
+        raise credential_exception
+
+    if refresh_revocation_list.is_revoked(payload["fam"], payload["fexp"]):
+        raise credential_exception
+    if refresh_revocation_list.is_revoked(payload["jti"], payload["exp"]):
+        # 이미 사용한 refresh token 의 재사용 -> 같은 family 의 refresh token 을 모두 막는다.
+        refresh_revocation_list.revoke(payload["fam"], payload["fexp"])
+        raise credential_exception
+
+    # 계정 상태 (비활성화 등) 가 바뀌었을 수 있으므로 refresh 할 때는 항상 유저를 다시 조회한다.
+    user = get_user(fake_users_db, payload["sub"])
+    if not user or user.disabled:
+        raise credential_exception
+
+    refresh_revocation_list.revoke(payload["jti"], payload["exp"])
+    return issue_tokens(user, family=payload["fam"], family_exp=payload["fexp"])
+
+
+@app.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_token(token: Annotated[str, Depends(oauth2_scheme)],
+                       refresh_token: Annotated[str | None, Form()] = None) -> None:
+    # 로그아웃: 현재 액세스 토큰 (+ 넘겨준 refresh token) 을 폐기한다.
+    for encoded in (token, refresh_token):
+        if encoded is None:
+            continue
+        try:
+            payload: dict = key_ring.verify(encoded)
+        except JWTError:
+            continue
+        revocation_list_for(payload).revoke(payload["jti"], payload["exp"])
 
 
 @app.get("/users/me", response_model=User)
@@ -153,6 +404,36 @@ async def read_users_me(current_user: Annotated[User, Depends(get_current_active
     return current_user
 
 
+# <JWKS>
+# - 다운스트림 서비스는 이 공개키 목록을 캐시해 두고 토큰을 로컬에서 검증한다. (issuer 호출 불필요)
+# - 키 교체 시 새 키가 먼저 올라오므로 max-age 보다 먼저 새 키를 add() 해 두면 된다.
+@app.get("/.well-known/jwks.json")
+async def read_jwks(request: Request) -> Response:
+    etag = key_ring.jwks_etag()
+    headers = {"Cache-Control": f"public, max-age={JWKS_MAX_AGE_SECONDS}", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=key_ring.jwks_body(), media_type="application/json", headers=headers)
+
+
+# 토큰 캐시 hit/miss 카운터. 서명 검증을 얼마나 아꼈는지 확인할 수 있다.
+@app.get("/metrics/token-cache")
+async def read_token_cache_metrics() -> dict[str, int | float]:
+    return token_cache.stats()
+
+
+# 폐기 목록 크기 (버킷 수, bloom filter 메모리)
+@app.get("/metrics/revocation")
+async def read_revocation_metrics() -> dict[str, dict[str, int]]:
+    return {"access": revocation_list.stats(), "refresh": refresh_revocation_list.stats()}
+
+
+# 패스워드 해싱 풀의 대기열 길이 / 대기 시간
+@app.get("/metrics/password-pool")
+async def read_password_pool_metrics() -> dict[str, int | float | str]:
+    return password_pool.stats()
+
+
 # <'sub' 를 쓰는 이유는?>
 # - 같은 사용자에게 로그인 권한을 가진 토큰 뿐만 아니라, 다른 권한을 가진 토큰을 줄 수 있게 된다.
 #   예를 들어 블로그에 글을 쓸 때 subject 를 "blog" 로 지정하여 토큰을 발급 해주면 해당 유저는 로그인 뿐만 아니라 블로그에 글을 쓸 수 있는 토큰도
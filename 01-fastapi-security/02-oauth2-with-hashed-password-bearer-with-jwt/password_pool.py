@@ -0,0 +1,151 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+# 워커 (스레드 또는 프로세스) 안에서 사용할 CryptContext.
+# - 프로세스 풀은 CryptContext 객체를 pickle 해서 넘길 수 없으므로 설정 문자열을 넘겨서 워커 안에서 다시 만든다.
+_worker_context: CryptContext | None = None
+
+
+def _init_worker(context_config: str) -> None:
+    global _worker_context
+    _worker_context = CryptContext.from_string(context_config)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return _worker_context.verify(plain_password, hashed_password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return _worker_context.verify_and_update(plain_password, hashed_password)
+
+
+def _hash(plain_password: str) -> str:
+    return _worker_context.hash(plain_password)
+
+
+class PasswordPoolSaturated(Exception):
+    pass
+
+
+# <Password hashing pool>
+# - bcrypt (cost 12) 는 1회에 약 250ms 가 걸린다. async def 안에서 그냥 호출하면 그동안 이벤트 루프 전체가 멈춘다.
+# - 해싱/검증을 전용 스레드 풀 또는 프로세스 풀에서 실행해서 이벤트 루프는 다른 요청 (/users/me 등) 을 계속 처리하게 한다.
+# - 동시에 실행되는 작업 수는 workers 개로 제한하고, 그 이상은 최대 max_queue 개 까지만 대기시킨다.
+#   대기열이 꽉 차면 PasswordPoolSaturated 를 발생시켜서 로그인 폭주가 메모리와 지연시간을 무한정 키우지 않게 한다.
+# - kind="process" 는 GIL 과 무관하게 CPU 코어를 쓸 수 있다. bcrypt 는 GIL 을 풀어주기 때문에 "thread" 로도 충분한 경우가 많다.
+class PasswordHashPool:
+    def __init__(self, context: CryptContext, kind: str = "thread", workers: int = 2, max_queue: int = 64):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown password pool kind: {kind}")
+
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self._context_config = context.to_string()
+        self._executor: Executor | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+        self.queued = 0
+        self.running = 0
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def start(self) -> None:
+        executor_class = ThreadPoolExecutor if self.kind == "thread" else ProcessPoolExecutor
+        self._executor = executor_class(max_workers=self.workers,
+                                        initializer=_init_worker,
+                                        initargs=(self._context_config,))
+        self._slots = asyncio.Semaphore(self.workers)
+
+    def shutdown(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _submit(self, fn, *args):
+        if self._executor is None:
+            self.start()
+
+        # 워커 수 + 대기열 길이를 넘어서는 요청은 바로 거절한다. (admission control)
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise PasswordPoolSaturated()
+
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        enqueued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        waited = time.perf_counter() - enqueued_at
+        self.admitted += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        self.running += 1
+        started_at = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        # 슬롯은 요청이 아니라 워커 작업이 끝날 때 반납한다.
+        # 기다리던 요청이 취소되어도 (클라이언트 연결 끊김) 이미 시작된 bcrypt 는 계속 돌기 때문에,
+        # finally 에서 반납하면 끊고 다시 보내는 클라이언트가 max_queue 를 넘어서 executor 에 작업을 쌓을 수 있다.
+        # 아직 시작 전인 작업은 wrap_future 가 같이 취소하므로 바로 반납된다.
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            # 종료된 executor 등으로 작업을 넣지 못했으면 done-callback 이 없으므로 여기서 반납한다.
+            self.running -= 1
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._call_soon(loop, self._release, started_at))
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback, *args) -> None:
+        # executor 스레드에서 불린다. 종료 중에 loop 가 먼저 닫혔으면 반납할 곳이 없다.
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass
+
+    def _release(self, started_at: float) -> None:
+        self.total_run_seconds += time.perf_counter() - started_at
+        self.running -= 1
+        self.completed += 1
+        self._slots.release()
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(_verify, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        # 검증에 성공했고 hash 가 오래된 설정이면 새 hash 도 같이 돌려준다. (같은 워커 작업 안에서)
+        return await self._submit(_verify_and_update, plain_password, hashed_password)
+
+    async def hash(self, plain_password: str) -> str:
+        return await self._submit(_hash, plain_password)
+
+    def stats(self) -> dict[str, int | float | str]:
+        admitted = self.admitted or 1
+        completed = self.completed or 1
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queue_depth": self.queued,
+            "max_queue_depth": self.max_queue_depth,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": self.total_wait_seconds / admitted * 1000,
+            "max_wait_ms": self.max_wait_seconds * 1000,
+            "avg_run_ms": self.total_run_seconds / completed * 1000,
+        }
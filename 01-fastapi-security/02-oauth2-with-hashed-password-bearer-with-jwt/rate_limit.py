@@ -0,0 +1,153 @@
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import OAuth2PasswordRequestForm
+from starlette import status
+
+
+# <Token bucket>
+# - 버킷에는 최대 capacity 개의 토큰이 있고, 초당 rate 개씩 다시 채워진다.
+# - 요청 1번에 토큰 cost 개를 쓴다. 토큰이 부족하면 거절하고, 다시 채워질 때까지 걸리는 시간을 Retry-After 로 알려준다.
+# - 버킷 상태는 (남은 토큰, 마지막 갱신 시각) 두 값 뿐이라서 키가 많아도 가볍다.
+def refill_and_take(tokens: float, updated_at: float, now: float,
+                    rate: float, capacity: float, cost: float) -> tuple[float, float]:
+    tokens = min(capacity, tokens + (now - updated_at) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class RateLimitBackend:
+    # 버킷 key 에서 cost 만큼 토큰을 꺼낸다. 허용이면 0, 거절이면 다시 시도할 수 있을 때까지의 초를 리턴한다.
+    async def consume(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        raise NotImplementedError
+
+
+# <샤딩된 in-memory 저장소>
+# - 워커 프로세스 하나 안에서만 상태를 공유한다.
+# - key 를 shard 로 나눠서 lock 경합을 줄인다. (threadpool 에서 도는 sync 의존성에서도 쓸 수 있게)
+# - 버킷마다 자기 rate / capacity 를 같이 저장한다. (user: / ip: 처럼 limit 이 다른 버킷이 같은 shard 에 섞여 있다)
+# - shard 가 max_keys_per_shard 를 넘으면
+#   1) 가득 찬 (= 한동안 요청이 없던) 버킷부터 지운다. 가득 찬 버킷은 없는 버킷과 같다.
+#   2) 그래도 넘으면 가장 오래 요청이 없던 버킷부터 (LRU) 지운다. 메모리 상한을 지키는 대신 그 버킷의 limit 은 초기화된다.
+class ShardedMemoryBackend(RateLimitBackend):
+    def __init__(self, shards: int = 16, max_keys_per_shard: int = 10_000):
+        self.max_keys_per_shard = max_keys_per_shard
+        # key -> [tokens, updated_at, rate, capacity]. 최근에 쓴 버킷이 뒤로 간다.
+        self._shards: list[tuple[threading.Lock, OrderedDict[str, list[float]]]] = [
+            (threading.Lock(), OrderedDict()) for _ in range(shards)
+        ]
+        self.evicted_lru = 0
+
+    def _shard(self, key: str) -> tuple[threading.Lock, OrderedDict[str, list[float]]]:
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    async def consume(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        lock, buckets = self._shard(key)
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= self.max_keys_per_shard:
+                    self._evict(buckets, now)
+                bucket = buckets[key] = [capacity, now, rate, capacity]
+            else:
+                buckets.move_to_end(key)
+
+            bucket[0], retry_after = refill_and_take(bucket[0], bucket[1], now, rate, capacity, cost)
+            bucket[1:] = [now, rate, capacity]
+        return retry_after
+
+    def _evict(self, buckets: OrderedDict[str, list[float]], now: float) -> None:
+        idle_keys = [key for key, (tokens, updated_at, rate, capacity) in buckets.items()
+                     if tokens + (now - updated_at) * rate >= capacity]
+        for key in idle_keys:
+            del buckets[key]
+        while len(buckets) >= self.max_keys_per_shard:
+            buckets.popitem(last=False)
+            self.evicted_lru += 1
+
+
+# <공유 저장소 (Redis) backend>
+# - 워커가 여러 개면 in-memory 버킷은 워커 수만큼 나뉘어서 실제 허용량이 N 배가 된다.
+# - 버킷 상태를 Redis hash 에 두고 Lua 스크립트로 "읽고-계산하고-쓰기" 를 원자적으로 한다.
+# - 시각은 Redis 서버의 TIME 을 써서 워커 간 시계 차이의 영향을 받지 않는다.
+# - client 는 redis.asyncio.Redis 처럼 `await client.eval(script, numkeys, *keys_and_args)` 를 지원하면 된다.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    def __init__(self, client, prefix: str = "rate-limit:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def consume(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        retry_after = await self.client.eval(TOKEN_BUCKET_SCRIPT, 1, self.prefix + key, rate, capacity, cost)
+        return float(retry_after)
+
+
+# <테스트용 로컬 stand-in>
+# - Redis 없이 RedisBackend 를 그대로 돌려볼 수 있도록 eval() 만 흉내낸다.
+# - TOKEN_BUCKET_SCRIPT 와 같은 계산을 파이썬으로 하고, 여러 RedisBackend 가 이 객체 하나를 공유하면 "여러 워커" 와 같다.
+class LocalRedisStandIn:
+    def __init__(self):
+        self._hashes: dict[str, tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    async def eval(self, script: str, numkeys: int, key: str, rate: float, capacity: float, cost: float) -> str:
+        now = time.time()
+        with self._lock:
+            tokens, updated_at, expires_at = self._hashes.get(key, (capacity, now, math.inf))
+            if expires_at <= now:
+                tokens, updated_at = capacity, now
+            tokens, retry_after = refill_and_take(tokens, updated_at, now, rate, capacity, cost)
+            self._hashes[key] = (tokens, now, now + math.ceil(capacity / rate) + 1)
+        return str(retry_after)
+
+
+# <로그인 rate limit 의존성>
+# - 유저 이름별 버킷: 한 계정에 대한 패스워드 대입 공격을 막는다.
+# - 클라이언트 IP 별 버킷: 한 클라이언트가 여러 계정을 돌아가며 시도하는 것을 막는다.
+# - 두 버킷 모두 통과해야 bcrypt 검증까지 간다. 거절이면 429 + Retry-After.
+class LoginRateLimit:
+    def __init__(self, backend: RateLimitBackend,
+                 per_user: tuple[float, float], per_ip: tuple[float, float]):
+        # (초당 rate, capacity)
+        self.backend = backend
+        self.per_user = per_user
+        self.per_ip = per_ip
+
+    async def __call__(self, request: Request, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> None:
+        client_ip = request.client.host if request.client else "unknown"
+        user_retry_after = await self.backend.consume(f"user:{form_data.username.lower()}", *self.per_user)
+        ip_retry_after = await self.backend.consume(f"ip:{client_ip}", *self.per_ip)
+
+        retry_after = max(user_retry_after, ip_retry_after)
+        if retry_after > 0:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail="로그인 시도가 너무 많습니다. 잠시 후 다시 시도해 주세요.",
+                                headers={"Retry-After": str(math.ceil(retry_after))})
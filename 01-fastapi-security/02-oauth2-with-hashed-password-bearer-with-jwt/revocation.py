@@ -0,0 +1,156 @@
+import hashlib
+import math
+import threading
+import time
+
+
+# <Bloom filter>
+# - "확실히 없음" 또는 "아마 있음" 만 대답하는 확률적 자료구조. 원소 하나당 몇 bit 만 쓴다.
+# - 폐기된 토큰은 전체 토큰 중 극히 일부이므로 대부분의 조회는 bloom 에서 "없음" 으로 바로 끝난다.
+class BloomFilter:
+    __slots__ = ("size_bits", "hash_count", "bits")
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        # m = -n ln(p) / (ln 2)^2, k = m / n * ln 2
+        self.size_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size_bits / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size_bits / 8))
+
+    def _positions(self, digest: bytes):
+        # double hashing: 해시 두 개로 k 개의 위치를 만든다.
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size_bits
+
+    def add(self, digest: bytes) -> None:
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest: bytes) -> bool:
+        for position in self._positions(digest):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+# <시간 버킷>
+# - 처음에는 정확한 digest 집합만 가진다. 대부분의 버킷은 폐기가 몇 개뿐이므로 집합이 bloom filter 보다 훨씬 작다.
+# - 집합이 exact_limit 개를 넘으면 bloom filter 로 바꾸고 집합을 버린다. (이후로는 오탐만 생길 수 있다. fail closed)
+# - bloom filter 는 scalable bloom filter 처럼 늘린다.
+#   - 첫 filter 는 exact_limit 의 2배 크기로 만든다.
+#   - 꽉 차면 2배 크기의 filter 를 하나 더 붙인다.
+#   - filter i 의 오탐률은 error_rate / 2^(i+1) 이다. 전체 오탐률은 대략 error_rate 정도로 유지된다.
+#   그래서 메모리는 버킷에 실제로 들어간 개수에 비례한다.
+class _Bucket:
+    __slots__ = ("exact", "blooms", "last_bloom_count", "count")
+
+    def __init__(self):
+        self.exact: set[bytes] | None = set()
+        self.blooms: list[BloomFilter] = []
+        self.last_bloom_count = 0
+        self.count = 0
+
+    def add(self, digest: bytes, exact_limit: int, error_rate: float) -> None:
+        self.count += 1
+        if self.exact is not None:
+            self.exact.add(digest)
+            if len(self.exact) > exact_limit:
+                # is_revoked 는 lock 없이 읽으므로, bloom filter 를 다 만든 뒤에 집합을 버린다.
+                # (집합을 먼저 버리면 그 사이에 폐기된 토큰이 통과할 수 있다)
+                migrated = _Bucket()
+                for existing in self.exact:
+                    migrated._add_to_bloom(existing, exact_limit, error_rate)
+                self.blooms, self.last_bloom_count = migrated.blooms, migrated.last_bloom_count
+                self.exact = None
+            return
+        self._add_to_bloom(digest, exact_limit, error_rate)
+
+    def _add_to_bloom(self, digest: bytes, exact_limit: int, error_rate: float) -> None:
+        # filter i 의 capacity 는 exact_limit * 2^(i+1). 마지막 filter 가 꽉 찼으면 다음 filter 를 붙인다.
+        if not self.blooms or self.last_bloom_count >= exact_limit * 2 ** len(self.blooms):
+            level = len(self.blooms) + 1
+            self.blooms.append(BloomFilter(exact_limit * 2 ** level, error_rate / 2 ** level))
+            self.last_bloom_count = 0
+        self.blooms[-1].add(digest)
+        self.last_bloom_count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        # exact 는 다른 스레드가 None 으로 바꿀 수 있으므로 한 번만 읽는다.
+        exact = self.exact
+        if exact is not None:
+            return digest in exact
+        return any(digest in bloom for bloom in self.blooms)
+
+    def bloom_bytes(self) -> int:
+        return sum(len(bloom.bits) for bloom in self.blooms)
+
+
+# <jti revocation list>
+# - 폐기된 토큰의 jti 를 토큰의 exp 가 속한 시간 버킷에 넣는다.
+# - 조회할 때는 토큰의 exp 로 버킷을 바로 찾으므로 O(1) 이다.
+# - 버킷의 끝 시각이 지나면 그 안의 토큰은 이미 만료됐으므로 버킷을 통째로 버린다. -> 만료된 엔트리가 자동으로 정리된다.
+# - 메모리: jti 는 16 bytes digest 로만 저장하고, 많이 폐기된 버킷만 bloom filter 로 바꾼다. (_Bucket)
+# - bucket_seconds 는 토큰 수명에 맞춘다. 수명이 긴 토큰 (refresh token, family) 은 exp 가 넓게 퍼지므로
+#   버킷을 크게 잡아야 버킷 수 (= 버킷당 고정 비용) 가 늘지 않는다.
+class RevocationList:
+    def __init__(self, bucket_seconds: int = 3600, exact_limit: int = 1024, error_rate: float = 0.001):
+        self.bucket_seconds = bucket_seconds
+        self.exact_limit = exact_limit
+        self.error_rate = error_rate
+        self._buckets: dict[int, _Bucket] = {}
+        self._lock = threading.Lock()
+        self._next_purge_at = 0.0
+
+    @staticmethod
+    def _digest(jti: str) -> bytes:
+        return hashlib.blake2b(jti.encode(), digest_size=16).digest()
+
+    def _bucket_id(self, exp: float) -> int:
+        # 버킷 id 는 버킷의 끝 시각 / bucket_seconds. exp 가 버킷 끝 시각 이전이므로 버킷을 버릴 때 안전하다.
+        return math.ceil(exp / self.bucket_seconds)
+
+    def revoke(self, jti: str, exp: float) -> None:
+        now = time.time()
+        if exp <= now:
+            # 이미 만료된 토큰은 폐기 목록에 넣을 필요가 없다.
+            return
+
+        digest = self._digest(jti)
+        bucket_id = self._bucket_id(exp)
+        with self._lock:
+            self._purge(now)
+            bucket = self._buckets.get(bucket_id)
+            if bucket is None:
+                bucket = self._buckets[bucket_id] = _Bucket()
+            bucket.add(digest, self.exact_limit, self.error_rate)
+
+    def is_revoked(self, jti: str | None, exp: float) -> bool:
+        if jti is None:
+            return False
+
+        now = time.time()
+        if now >= self._next_purge_at:
+            with self._lock:
+                self._purge(now)
+
+        bucket = self._buckets.get(self._bucket_id(exp))
+        if bucket is None:
+            return False
+
+        return self._digest(jti) in bucket
+
+    def _purge(self, now: float) -> None:
+        expired_ids = [bucket_id for bucket_id in self._buckets if bucket_id * self.bucket_seconds <= now]
+        for bucket_id in expired_ids:
+            del self._buckets[bucket_id]
+        self._next_purge_at = now + self.bucket_seconds
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "buckets": len(self._buckets),
+                "revoked": sum(bucket.count for bucket in self._buckets.values()),
+                "bloom_only_buckets": sum(1 for bucket in self._buckets.values() if bucket.exact is None),
+                "bloom_bytes": sum(bucket.bloom_bytes() for bucket in self._buckets.values()),
+            }
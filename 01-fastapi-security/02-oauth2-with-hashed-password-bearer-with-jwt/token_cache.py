@@ -0,0 +1,102 @@
+import hashlib
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+# <검증된 JWT 캐시>
+# - 같은 bearer token 이 만료 전까지 수천 번 들어오는데, 매번 jwt.decode (서명 검증) + get_user 를 다시 할 필요는 없다.
+# - 토큰 원문 대신 sha256 digest 를 key 로 쓴다. 메모리에 토큰 원문을 들고 있지 않고, key 길이도 32 bytes 로 고정된다.
+# - 엔트리는 토큰의 'exp' 시각에 만료된다. 만료된 엔트리는 조회 시점과 삽입 시점에 정리한다.
+# - maxsize 를 넘으면 가장 오래 안 쓰인 엔트리부터 버린다. (LRU)
+# - get_current_user 는 sync def 라서 threadpool 에서 돌기 때문에 lock 으로 보호한다.
+class VerifiedTokenCache:
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        # digest -> (exp, payload, user)
+        self._entries: OrderedDict[bytes, tuple[float, dict, Any]] = OrderedDict()
+        # (exp, digest) 의 min-heap. 만료된 엔트리를 앞에서부터 꺼내서 정리한다.
+        self._expiry_heap: list[tuple[float, bytes]] = []
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> tuple[dict, Any] | None:
+        key = self._digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            exp, payload, user = entry
+            if exp <= now:
+                # 만료된 토큰은 캐시에서도 바로 지운다. 디코드 경로에서 ExpiredSignatureError 가 난다.
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload, user
+
+    def set(self, token: str, payload: dict, user: Any) -> None:
+        exp = payload.get("exp")
+        if exp is None:
+            # exp 가 없는 토큰은 언제 지워야 할지 알 수 없으므로 캐시하지 않는다.
+            return
+
+        key = self._digest(token)
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            self._entries[key] = (float(exp), payload, user)
+            self._entries.move_to_end(key)
+            heapq.heappush(self._expiry_heap, (float(exp), key))
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+            # LRU 로 밀려난 엔트리가 heap 에 계속 쌓이지 않도록 heap 이 너무 커지면 다시 만든다.
+            if len(self._expiry_heap) > 2 * self.maxsize:
+                self._expiry_heap = [(entry[0], digest) for digest, entry in self._entries.items()]
+                heapq.heapify(self._expiry_heap)
+
+    def _purge_expired(self, now: float) -> None:
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            exp, key = heapq.heappop(self._expiry_heap)
+            entry = self._entries.get(key)
+            # 같은 key 가 다시 들어온 경우 (exp 가 다름) 는 지우지 않는다.
+            if entry is not None and entry[0] == exp:
+                del self._entries[key]
+                self.expired += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._expiry_heap.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
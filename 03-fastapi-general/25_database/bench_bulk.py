@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# 벤치마크는 임시 SQLite 파일을 쓴다. database 모듈을 import 하기 전에 URL 을 정해야 한다.
+BENCH_DIR = tempfile.mkdtemp()
+os.environ["SQLALCHEMY_DB_URL"] = f"sqlite+aiosqlite:///{BENCH_DIR}/bench_bulk.db"
+
+from sqlalchemy import insert  # noqa: E402
+
+from crud import create_item, create_items_bulk  # noqa: E402
+from database import engine, Base, SessionLocal  # noqa: E402
+from models import User  # noqa: E402
+from schemas import ItemCreate, ItemBulkCreate  # noqa: E402
+
+# <Single-row vs bulk insert 벤치마크>
+# - single: crud.create_item 을 row 마다 호출 (add + commit + refresh)
+# - bulk: crud.create_items_bulk 를 chunk 마다 호출 (multi-row INSERT ... RETURNING + commit 1번)
+# 실행: python bench_bulk.py --rows 20000 --chunk-size 1000
+
+
+async def bench_single(rows: int) -> float:
+    async with SessionLocal() as db:
+        started_at = time.perf_counter()
+        for i in range(rows):
+            await create_item(db, ItemCreate(title=f"single-{i}", description="d"), user_id=1)
+        return rows / (time.perf_counter() - started_at)
+
+
+async def bench_bulk(rows: int, chunk_size: int) -> float:
+    async with SessionLocal() as db:
+        started_at = time.perf_counter()
+        for start in range(0, rows, chunk_size):
+            chunk = [ItemBulkCreate(title=f"bulk-{i}", description="d", owner_id=1)
+                     for i in range(start, min(start + chunk_size, rows))]
+            await create_items_bulk(db, chunk)
+        return rows / (time.perf_counter() - started_at)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(insert(User), [{"id": 1, "email": "owner@example.com", "hashed_password": "x"}])
+
+    # single-row 경로는 느리므로 row 수를 줄여서 잰다.
+    single_rows = max(1, args.rows // 10)
+    single = await bench_single(single_rows)
+    bulk = await bench_bulk(args.rows, args.chunk_size)
+    print(f"{f'single-row ({single_rows} rows)':<36} {single:>10.0f} rows/s")
+    print(f"{f'bulk ({args.rows} rows, chunk {args.chunk_size})':<36} {bulk:>10.0f} rows/s   x{bulk / single:.1f}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# <워커 cold start 벤치마크>
+# - 워커 프로세스 하나를 새로 띄워서 "import main -> lifespan 시작 (schema 초기화 + pool warm-up) -> 첫 요청 응답" 까지의 시간을 잰다.
+# - DB_SCHEMA_INIT 별로 비교한다.
+#   - always: 매번 create_all + 검색 인덱스 확인 (이전 동작)
+#   - fingerprint: 저장된 schema fingerprint 가 같으면 DDL 확인을 건너뛴다.
+# - 테이블이 이미 있는 DB (= 두 번째 이후 배포 / 재시작) 에서 잰다. 첫 실행은 측정에서 뺀다.
+# - --latency-ms: SQL 문마다 이만큼 기다려서 원격 DB 의 왕복 시간을 흉내낸다. (로컬 SQLite 는 왕복이 거의 0 이다)
+# 실행: python bench_cold_start.py --workers 10 --latency-ms 2
+
+
+def run_worker(latency_ms: float) -> None:
+    # 자식 프로세스. 결과를 JSON 한 줄로 stdout 에 쓴다.
+    started_at = time.perf_counter()
+    import httpx
+    from sqlalchemy import event
+
+    import main
+    from database import engine
+    from query_counter import QueryCounter
+    imported_at = time.perf_counter()
+
+    if latency_ms:
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: time.sleep(latency_ms / 1000))
+
+    async def start_and_request() -> tuple[float, float, int]:
+        with QueryCounter(engine) as counter:
+            async with main.lifespan(main.app):
+                ready_at = time.perf_counter()
+                startup_queries = counter.count
+                transport = httpx.ASGITransport(app=main.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                    (await client.get("/users/?limit=1")).raise_for_status()
+                return ready_at, time.perf_counter(), startup_queries
+
+    ready_at, responded_at, startup_queries = asyncio.run(start_and_request())
+    print(json.dumps({
+        "import_ms": (imported_at - started_at) * 1000,
+        "startup_ms": (ready_at - imported_at) * 1000,
+        "first_response_ms": (responded_at - started_at) * 1000,
+        "startup_queries": startup_queries,
+    }))
+
+
+def spawn_worker(url: str, mode: str, latency_ms: float) -> dict:
+    env = {**os.environ, "SQLALCHEMY_DB_URL": url, "DB_SCHEMA_INIT": mode}
+    started_at = time.perf_counter()
+    output = subprocess.run([sys.executable, __file__, "--worker", "--latency-ms", str(latency_ms)],
+                            env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    # 인터프리터 시작까지 포함한 프로세스 기준 시간
+    result["process_ms"] = (time.perf_counter() - started_at) * 1000
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="기본은 임시 SQLite 파일")
+    parser.add_argument("--workers", type=int, default=10, help="모드별로 띄울 워커 수")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.latency_ms)
+        return
+
+    url = args.url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench_cold_start.db"
+    # 테이블 / 검색 인덱스 / fingerprint 를 미리 만들어 둔다.
+    spawn_worker(url, "fingerprint", 0.0)
+
+    print(f"{'mode':>12} {'queries':>8} {'startup':>10} {'first resp':>11} {'process':>10}  (ms, median of {args.workers})")
+    for mode in ("always", "fingerprint"):
+        results = [spawn_worker(url, mode, args.latency_ms) for _ in range(args.workers)]
+        print(f"{mode:>12} {results[-1]['startup_queries']:>8}"
+              f" {statistics.median(result['startup_ms'] for result in results):>10.1f}"
+              f" {statistics.median(result['first_response_ms'] for result in results):>11.1f}"
+              f" {statistics.median(result['process_ms'] for result in results):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+
+# <Endpoint 벤치마크 runner>
+# - seed.py 로 채운 DB 에 대해 main.py 의 엔드포인트들을 실제 HTTP 서버 없이 ASGI app 에 직접 (in-process) 요청한다.
+#   (httpx.ASGITransport) 네트워크 / uvicorn 비용 없이 앱 + DB 경로만 잰다.
+# - 시나리오마다 --requests 개의 요청을 --concurrency 개의 동시 클라이언트로 보내고 throughput 과 p50 / p95 / p99 지연시간을 출력한다.
+# - 결과는 JSON 으로 저장한다. --compare 로 이전 결과 파일을 주면 시나리오별로 비교해서 보여준다.
+# 실행
+#   python seed.py --users 100000 --items 1000000
+#   python bench_endpoints.py --output results/before.json
+#   (코드 수정 후) python bench_endpoints.py --output results/after.json --compare results/before.json
+
+DEFAULT_URL = "sqlite+aiosqlite:///./bench.db"
+# 쓰기 시나리오는 DB 를 바꾸므로 --scenarios 로 명시했을 때만 돈다.
+WRITE_SCENARIOS = {"create_user", "create_item", "bulk_users", "bulk_items"}
+# 테이블 전체를 읽는 시나리오도 요청 하나가 seed 크기만큼 오래 걸리므로 --scenarios 로 명시했을 때만 돈다.
+FULL_SCAN_SCENARIOS = {"export_items", "export_items_csv"}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark 25_database endpoints in-process")
+    parser.add_argument("--url", default=os.getenv("SQLALCHEMY_DB_URL", DEFAULT_URL))
+    parser.add_argument("--requests", type=int, default=500, help="시나리오당 요청 수")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="시나리오마다 측정 전에 보내는 요청 수")
+    parser.add_argument("--scenarios", help="콤마로 구분한 시나리오 이름. 기본은 읽기 시나리오 전부")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="결과 JSON 파일 경로")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON 파일 경로")
+    return parser.parse_args()
+
+
+# <시나리오>
+# - (random, 데이터 크기) 를 받아서 요청 하나 (method, path, json body) 를 만드는 함수들
+# - 유저 / item id 는 seed 된 범위 안에서 고른다.
+def build_scenarios(users: int, items: int) -> dict:
+    def read_user(generator: random.Random):
+        return "GET", f"/users/{generator.randint(1, users)}", None
+
+    def read_user_capped(generator: random.Random):
+        return "GET", f"/users/{generator.randint(1, users)}?items_limit=20", None
+
+    def list_user_items(generator: random.Random):
+        return "GET", f"/users/{generator.randint(1, users)}/items?limit=100", None
+
+    def list_users(generator: random.Random):
+        return "GET", f"/users/?skip={generator.randint(0, max(0, users - 100))}&limit=20", None
+
+    def list_items(generator: random.Random):
+        return "GET", "/items/?limit=100", None
+
+    def list_items_deep_offset(generator: random.Random):
+        return "GET", f"/items/?skip={generator.randint(0, max(0, items - 100))}&limit=100", None
+
+    def list_items_by_title(generator: random.Random):
+        return "GET", "/items/?limit=100&sort=title", None
+
+    def search_items(generator: random.Random):
+        return "GET", f"/items/search?q={generator.choice(['chair', 'oak table', 'vintage lamp', 'ood'])}", None
+
+    def create_user(generator: random.Random):
+        return "POST", "/users/", {"email": f"bench-{generator.getrandbits(64):x}@example.com", "password": "secret"}
+
+    def create_item(generator: random.Random):
+        return "POST", f"/users/{generator.randint(1, users)}/items/", {"title": "bench item", "description": "d"}
+
+    def export_items(generator: random.Random):
+        return "GET", "/items/export?format=ndjson", None
+
+    def export_items_csv(generator: random.Random):
+        return "GET", "/items/export?format=csv", None
+
+    def bulk_users(generator: random.Random):
+        return "POST", "/users/bulk", [{"email": f"bench-{generator.getrandbits(64):x}@example.com", "password": "secret"}
+                                       for _ in range(100)]
+
+    def bulk_items(generator: random.Random):
+        return "POST", "/items/bulk", [{"title": "bench item", "owner_id": generator.randint(1, users)}
+                                       for _ in range(100)]
+
+    return {function.__name__: function for function in [
+        read_user, read_user_capped, list_user_items, list_users, list_items, list_items_deep_offset, list_items_by_title, search_items,
+        export_items, export_items_csv, create_user, create_item, bulk_users, bulk_items,
+    ]}
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, scenario, args: argparse.Namespace, generator: random.Random) -> dict:
+    async def send(request) -> tuple[float, int]:
+        method, path, body = request
+        started_at = time.perf_counter()
+        response = await client.request(method, path, json=body)
+        await response.aread()
+        return time.perf_counter() - started_at, response.status_code
+
+    for _ in range(args.warmup):
+        await send(scenario(generator))
+
+    # 요청은 미리 다 만들어 두고, 동시 클라이언트들이 하나씩 가져가서 보낸다.
+    requests = [scenario(generator) for _ in range(args.requests)]
+    queue = iter(requests)
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+
+    async def worker() -> None:
+        for request in queue:
+            latency, status_code = await send(request)
+            latencies.append(latency)
+            statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "concurrency": args.concurrency,
+        "seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "statuses": statuses,
+    }
+
+
+def print_results(results: dict, baseline: dict | None) -> None:
+    header = f"{'scenario':>24} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses"
+    if baseline:
+        header += "   (vs baseline: rps / p95)"
+    print(header)
+    for name, result in results.items():
+        line = (f"{name:>24} {result['throughput_rps']:>9.1f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f}"
+                f" {result['p99_ms']:>9.2f}  {result['statuses']}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            line += (f"   {result['throughput_rps'] / previous['throughput_rps']:.2f}x"
+                     f" / {result['p95_ms'] / previous['p95_ms']:.2f}x")
+        print(line)
+
+
+async def main(args: argparse.Namespace) -> None:
+    # database 모듈은 import 할 때 engine 을 만들므로 URL 을 먼저 정한다.
+    os.environ["SQLALCHEMY_DB_URL"] = args.url
+    import httpx
+    import sqlalchemy
+    from sqlalchemy import func, select
+    import main as app_module
+    from database import SessionLocal
+    from models import User, Item
+
+    async with SessionLocal() as db:
+        users = (await db.execute(select(func.count()).select_from(User))).scalar_one()
+        items = (await db.execute(select(func.count()).select_from(Item))).scalar_one()
+    if not users:
+        raise SystemExit("DB 가 비어 있습니다. 먼저 seed.py 를 실행해 주세요.")
+
+    scenarios = build_scenarios(users, items)
+    names = args.scenarios.split(",") if args.scenarios else [name for name in scenarios
+                                                           if name not in WRITE_SCENARIOS | FULL_SCAN_SCENARIOS]
+    unknown = set(names) - set(scenarios)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))} (choose from {', '.join(scenarios)})")
+
+    generator = random.Random(args.seed)
+    results = {}
+    # ASGITransport 는 lifespan 을 실행하지 않으므로 직접 실행한다. (테이블 / 검색 인덱스 / pool warm-up)
+    async with app_module.lifespan(app_module.app):
+        # 앱에서 난 예외는 500 응답으로 세어서 statuses 에 남긴다. (e.g. SQLite 의 database is locked)
+        transport = httpx.ASGITransport(app=app_module.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in names:
+                results[name] = await run_scenario(client, scenarios[name], args, generator)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+    print(f"users={users} items={items} url={args.url}\n")
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "url": sqlalchemy.make_url(args.url).render_as_string(hide_password=True),
+                "users": users,
+                "items": items,
+                "python": platform.python_version(),
+                "sqlalchemy": sqlalchemy.__version__,
+                "machine": platform.platform(),
+                "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            },
+            "results": results,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\n{args.output} 저장")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
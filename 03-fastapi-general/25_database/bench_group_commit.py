@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+# 벤치마크는 임시 SQLite 파일을 쓴다. database 모듈을 import 하기 전에 URL 을 정해야 한다.
+BENCH_DIR = tempfile.mkdtemp()
+os.environ.setdefault("SQLALCHEMY_DB_URL", f"sqlite+aiosqlite:///{BENCH_DIR}/bench_group_commit.db")
+
+from sqlalchemy import insert  # noqa: E402
+
+from crud import create_item  # noqa: E402
+from database import engine, Base, SessionLocal  # noqa: E402
+from models import User  # noqa: E402
+from schemas import ItemCreate  # noqa: E402
+from write_batcher import ItemWriteBatcher  # noqa: E402
+
+# <요청마다 commit vs group commit 벤치마크>
+# - 동시 writer 수 (1 / 16 / 128) 별로 item 을 --items 개 만들면서 throughput 과 요청 하나의 지연시간을 잰다.
+#   - per-request: 요청마다 세션을 열고 crud.create_item (INSERT + commit) 한다. (기존 경로)
+#   - group commit: ItemWriteBatcher.submit() 으로 보낸다.
+# - 실패한 요청 수도 출력한다. (SQLite 는 동시에 commit 하려는 writer 가 많으면 database is locked 가 날 수 있다)
+# 실행: python bench_group_commit.py --items 2000
+#       SQLALCHEMY_DB_URL=postgresql+asyncpg://... python bench_group_commit.py
+
+
+async def seed() -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(insert(User).prefix_with("OR IGNORE", dialect="sqlite"),
+                                 [{"id": 1, "email": "owner@example.com", "hashed_password": "x"}])
+
+
+async def per_request(item: ItemCreate) -> None:
+    async with SessionLocal() as db:
+        await create_item(db, item, 1)
+
+
+async def run(write, writers: int, items: int) -> dict[str, float]:
+    latencies: list[float] = []
+    failures = 0
+    remaining = iter(range(items))
+
+    async def writer() -> None:
+        nonlocal failures
+        for index in remaining:
+            started_at = time.perf_counter()
+            try:
+                await write(ItemCreate(title=f"item-{index}", description="d"))
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[writer() for _ in range(writers)])
+    elapsed = time.perf_counter() - started_at
+    latencies.sort()
+    return {
+        "rps": items / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "failures": failures,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--writers", default="1,16,128")
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch-size", type=int, default=128)
+    args = parser.parse_args()
+
+    await seed()
+    batcher = ItemWriteBatcher(SessionLocal, window_seconds=args.window_ms / 1000, max_batch_size=args.max_batch_size)
+    batcher.start()
+
+    print(f"{'writers':>8} {'mode':>14} {'rps':>9} {'p50 ms':>9} {'p99 ms':>9} {'failures':>9}")
+    for writers in [int(value) for value in args.writers.split(",")]:
+        for mode, write in [("per-request", per_request), ("group commit", lambda item: batcher.submit(item, 1))]:
+            result = await run(write, writers, args.items)
+            print(f"{writers:>8} {mode:>14} {result['rps']:>9.1f} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}"
+                  f" {result['failures']:>9}")
+
+    await batcher.close()
+    stats = batcher.stats()
+    print(f"\ngroup commit: {stats['batches']} batches, average {stats['average_batch_size']:.1f} items / batch")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
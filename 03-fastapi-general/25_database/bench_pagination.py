@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# 벤치마크는 임시 SQLite 파일을 쓴다. database 모듈을 import 하기 전에 URL 을 정해야 한다.
+BENCH_DIR = tempfile.mkdtemp()
+os.environ["SQLALCHEMY_DB_URL"] = f"sqlite+aiosqlite:///{BENCH_DIR}/bench_pagination.db"
+
+from sqlalchemy import insert  # noqa: E402
+
+from crud import get_items  # noqa: E402
+from database import engine, Base, SessionLocal  # noqa: E402
+from models import User, Item  # noqa: E402
+
+# <Offset vs keyset pagination 벤치마크>
+# - items 를 N 개 만들고, 여러 페이지 깊이에서 get_items 한 번의 시간을 잰다.
+# - offset 은 깊이에 비례해서 느려지고, cursor 는 깊이와 상관없이 일정해야 한다.
+# 실행: python bench_pagination.py --items 200000
+
+
+async def seed(items: int, chunk_size: int = 10_000) -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(insert(User), [{"id": 1, "email": "owner@example.com", "hashed_password": "x"}])
+        for start in range(0, items, chunk_size):
+            rows = [{"title": f"title-{(i * 7919) % items:08d}", "description": "d", "owner_id": 1}
+                    for i in range(start, min(start + chunk_size, items))]
+            await connection.execute(insert(Item), rows)
+
+
+async def time_page(repeat: int, **kwargs) -> float:
+    async with SessionLocal() as db:
+        await get_items(db, **kwargs)  # warm-up
+        started_at = time.perf_counter()
+        for _ in range(repeat):
+            await get_items(db, **kwargs)
+            db.expunge_all()
+        return (time.perf_counter() - started_at) / repeat * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    await seed(args.items)
+    depths = [0, args.items // 100, args.items // 10, args.items // 2, args.items - args.limit]
+
+    async with SessionLocal() as db:
+        # title 정렬 cursor 는 해당 깊이의 (title, id) 를 미리 구해 둔다.
+        title_cursors = {depth: (item.title, item.id) for depth in depths
+                         for item in await get_items(db, skip=depth, limit=1, sort="title")}
+
+    print(f"{'depth':>10} {'offset id':>12} {'cursor id':>12} {'offset title':>14} {'cursor title':>14}  (ms/page)")
+    for depth in depths:
+        offset_id = await time_page(args.repeat, skip=depth, limit=args.limit)
+        cursor_id = await time_page(args.repeat, limit=args.limit, after=(depth,))
+        offset_title = await time_page(args.repeat, skip=depth, limit=args.limit, sort="title")
+        cursor_title = await time_page(args.repeat, limit=args.limit, sort="title", after=title_cursors[depth])
+        print(f"{depth:>10} {offset_id:>12.2f} {cursor_id:>12.2f} {offset_title:>14.2f} {cursor_title:>14.2f}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
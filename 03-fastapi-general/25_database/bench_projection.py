@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# 벤치마크는 임시 SQLite 파일을 쓴다. database 모듈을 import 하기 전에 URL 을 정해야 한다.
+BENCH_DIR = tempfile.mkdtemp()
+os.environ["SQLALCHEMY_DB_URL"] = f"sqlite+aiosqlite:///{BENCH_DIR}/bench_projection.db"
+
+from sqlalchemy import insert, select  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+import schemas  # noqa: E402
+from crud import get_users, get_items  # noqa: E402
+from database import engine, Base, SessionLocal  # noqa: E402
+from models import User, Item  # noqa: E402
+
+# <ORM entity vs column projection 벤치마크>
+# - 같은 listing 을 두 가지 방법으로 읽어서 응답 스키마 객체 리스트를 만드는 데까지의 시간을 잰다.
+#   - orm: 전체 entity 를 읽고 (users 는 selectinload 로 items 도) identity map 에 넣은 뒤 응답 스키마로 변환한다. (이전 경로)
+#   - projection: 응답 스키마에 필요한 컬럼만 읽고 row tuple 에서 바로 스키마 객체를 만든다. (crud 의 load_for)
+# 실행: python bench_projection.py --rows 10000
+
+
+async def seed(rows: int, items_per_user: int, chunk_size: int = 10_000) -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        for start in range(0, rows, chunk_size):
+            await connection.execute(insert(User), [
+                {"id": i + 1, "email": f"user-{i}@example.com", "hashed_password": "x" * 60}
+                for i in range(start, min(start + chunk_size, rows))
+            ])
+        items = rows * items_per_user
+        for start in range(0, items, chunk_size):
+            await connection.execute(insert(Item), [
+                {"title": f"title-{i}", "description": "d" * 40, "owner_id": i % rows + 1}
+                for i in range(start, min(start + chunk_size, items))
+            ])
+
+
+async def orm_users(db, limit: int) -> list:
+    result = await db.execute(select(User).options(selectinload(User.items)).order_by(User.id).limit(limit))
+    return [schemas.User.model_validate(user, from_attributes=True) for user in result.scalars().all()]
+
+
+async def orm_items(db, limit: int) -> list:
+    result = await db.execute(select(Item).order_by(Item.id).limit(limit))
+    return [schemas.Item.model_validate(item, from_attributes=True) for item in result.scalars().all()]
+
+
+async def projection_users(db, limit: int) -> list:
+    return await get_users(db, limit=limit, load_for=schemas.User)
+
+
+async def projection_items(db, limit: int) -> list:
+    return await get_items(db, limit=limit, load_for=schemas.Item)
+
+
+async def time_listing(listing, limit: int, repeat: int) -> float:
+    async with SessionLocal() as db:
+        await listing(db, limit)  # warm-up
+        db.expunge_all()
+        started_at = time.perf_counter()
+        for _ in range(repeat):
+            await listing(db, limit)
+            db.expunge_all()
+        return (time.perf_counter() - started_at) / repeat * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--items-per-user", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    await seed(args.rows, args.items_per_user)
+
+    print(f"{'listing':>24} {'orm':>10} {'projection':>12} {'speedup':>8}  (ms/listing)")
+    for name, orm, projection in [("users (+items)", orm_users, projection_users),
+                                  ("items", orm_items, projection_items)]:
+        orm_ms = await time_listing(orm, args.rows, args.repeat)
+        projection_ms = await time_listing(projection, args.rows, args.repeat)
+        print(f"{name:>24} {orm_ms:>10.1f} {projection_ms:>12.1f} {orm_ms / projection_ms:>7.2f}x")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
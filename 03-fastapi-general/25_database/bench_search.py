@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# 벤치마크는 임시 SQLite 파일을 쓴다. database 모듈을 import 하기 전에 URL 을 정해야 한다.
+BENCH_DIR = tempfile.mkdtemp()
+os.environ["SQLALCHEMY_DB_URL"] = f"sqlite+aiosqlite:///{BENCH_DIR}/bench_search.db"
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from crud import search_items  # noqa: E402
+from database import engine, Base, SessionLocal  # noqa: E402
+from models import User, Item  # noqa: E402
+from schemas import Item as ItemSchema  # noqa: E402
+from search import install_search_index, search_scores  # noqa: E402
+
+# <LIKE 스캔 vs 전문 검색 인덱스 벤치마크>
+# - 단어 조합으로 만든 title / description 을 가진 items 를 N 개 만들고 (기본 100만), 검색어마다 시간을 잰다.
+#   - like scan: 인덱스 없이 LIKE '%...%' 로 매칭되는 row 를 모두 찾는다. 랭킹을 하려면 최소한 이만큼은 읽어야 한다.
+#   - fts match: FTS5 인덱스로 매칭되는 row 를 모두 찾는다. (개수만)
+#   - fts page: search_items 로 관련도 순 첫 페이지를 받는다. 매칭된 row 전체의 bm25 를 계산하므로 매칭 수에 비례한다.
+# - 검색 인덱스는 데이터를 다 넣은 뒤 한 번에 만든다. (rebuild 시간도 같이 출력)
+# 실행: python bench_search.py --rows 1000000
+
+WORDS = [f"{consonant}{vowel}{ending}" for consonant in "bcdfgklmnprstvz" for vowel in ("a", "e", "i", "o", "u", "ai", "ou")
+         for ending in ("n", "r", "st", "ck", "ll", "mp", "nd", "ght", "x", "sh",
+                        "lt", "ft", "rk", "ng", "ss", "th", "zz", "wn", "ct", "pt")]
+# 실제 텍스트처럼 단어 빈도가 Zipf 분포를 따르게 한다. (앞쪽 단어일수록 자주 나온다)
+WORD_CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(WORDS) + 1)))
+# 자주 나오는 단어 / 중간 빈도 단어 / 드문 단어 / 단어 조합 / 단어 중간의 부분 문자열
+QUERIES = [WORDS[0], WORDS[200], WORDS[-1], f"{WORDS[50]} {WORDS[300]}",
+           next(word for word in WORDS[1000:] if len(word) >= 5)[1:]]
+
+
+async def seed(rows: int, chunk_size: int = 20_000) -> None:
+    generator = random.Random(42)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(insert(User), [{"id": 1, "email": "owner@example.com", "hashed_password": "x"}])
+        for start in range(0, rows, chunk_size):
+            await connection.execute(insert(Item), [
+                {"title": " ".join(generator.choices(WORDS, cum_weights=WORD_CUM_WEIGHTS, k=3)),
+                 "description": " ".join(generator.choices(WORDS, cum_weights=WORD_CUM_WEIGHTS, k=12)),
+                 "owner_id": 1}
+                for _ in range(start, min(start + chunk_size, rows))
+            ])
+
+
+async def count_matches(db, dialect: str, q: str) -> int:
+    # dialect="generic" 이면 인덱스를 쓸 수 없는 DB 의 경로 (search_scores 의 LIKE fallback) 로 찾는다.
+    matches = search_scores(dialect, q).subquery()
+    return (await db.execute(select(func.count()).select_from(matches))).scalar_one()
+
+
+async def like_scan(db, q: str, limit: int) -> int:
+    return await count_matches(db, "generic", q)
+
+
+async def fts_match(db, q: str, limit: int) -> int:
+    return await count_matches(db, "sqlite", q)
+
+
+async def fts_page(db, q: str, limit: int) -> int:
+    items, _ = await search_items(db, q, limit, load_for=ItemSchema)
+    return len(items)
+
+
+async def time_query(search, q: str, limit: int, repeat: int) -> tuple[float, int]:
+    timings = []
+    async with SessionLocal() as db:
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            found = await search(db, q, limit)
+            timings.append((time.perf_counter() - started_at) * 1000)
+    return statistics.median(timings), found
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    await seed(args.rows)
+    print(f"seed {args.rows} rows: {time.perf_counter() - started_at:.1f}s")
+
+    started_at = time.perf_counter()
+    async with engine.begin() as connection:
+        await connection.run_sync(install_search_index)
+    print(f"build search index: {time.perf_counter() - started_at:.1f}s\n")
+
+    print(f"{'query':>14} {'matches':>9} {'like scan':>10} {'fts match':>10} {'fts page':>9}  (ms, median)")
+    for q in QUERIES:
+        like_ms, like_matches = await time_query(like_scan, q, args.limit, args.repeat)
+        match_ms, fts_matches = await time_query(fts_match, q, args.limit, args.repeat)
+        page_ms, _ = await time_query(fts_page, q, args.limit, args.repeat)
+        # trigram 인덱스와 LIKE 는 같은 row 를 찾아야 한다.
+        assert like_matches == fts_matches, (q, like_matches, fts_matches)
+        print(f"{q!r:>14} {fts_matches:>9} {like_ms:>10.1f} {match_ms:>10.1f} {page_ms:>9.1f}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+import json
+from typing import Any, AsyncIterator
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from starlette import status
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# NDJSON 한 줄 (row 하나) 의 최대 크기. 줄바꿈 없이 계속 보내는 body 가 buffer 를 끝없이 키우지 못하게 한다.
+NDJSON_MAX_LINE_BYTES = 64 * 1024
+
+
+# body 를 읽다가 row 하나를 만들지 못했을 때 row 대신 넘기는 값. (row 는 JSON 이면 무엇이든 될 수 있으므로 str 과 구분한다)
+class RowError:
+    __slots__ = ("detail",)
+
+    def __init__(self, detail: str):
+        self.detail = detail
+
+
+# <Bulk 요청 body 읽기>
+# - application/json: row 배열. body 전체를 한 번에 읽는다.
+# - application/x-ndjson: 한 줄에 row 하나. body 를 스트림으로 읽으면서 줄 단위로 넘겨주므로 큰 import 도 메모리에 다 올리지 않는다.
+# - (index, row) 를 넘겨준다. 줄이 JSON 이 아니거나 너무 길면 row 대신 RowError 를 넘긴다.
+async def iter_bulk_rows(request: Request) -> AsyncIterator[tuple[int, Any]]:
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        index = 0
+        buffer = b""
+        # 너무 긴 줄은 에러로 넘기고, 다음 줄바꿈까지 들어오는 나머지는 버린다.
+        skipping = False
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if skipping:
+                    skipping = False
+                elif len(line) > NDJSON_MAX_LINE_BYTES:
+                    yield index, RowError("Line too long")
+                    index += 1
+                elif line.strip():
+                    yield index, _parse_line(line)
+                    index += 1
+            if len(buffer) > NDJSON_MAX_LINE_BYTES:
+                if not skipping:
+                    yield index, RowError("Line too long")
+                    index += 1
+                    skipping = True
+                buffer = b""
+        if buffer.strip() and not skipping:
+            yield index, _parse_line(buffer)
+        return
+
+    try:
+        rows = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid JSON")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Expected a JSON array")
+    for index, row in enumerate(rows):
+        yield index, row
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return RowError("Invalid JSON")
+
+
+async def iter_validated_chunks(request: Request, schema: type[BaseModel], chunk_size: int):
+    # chunk_size 개씩 검증해서 (유효한 row 들 [(index, model)], 실패한 row 들 [(index, detail)]) 로 넘겨준다.
+    valid: list[tuple[int, BaseModel]] = []
+    invalid: list[tuple[int, str | list]] = []
+    async for index, row in iter_bulk_rows(request):
+        if isinstance(row, RowError):
+            invalid.append((index, row.detail))
+        else:
+            try:
+                valid.append((index, schema.model_validate(row)))
+            except ValidationError as error:
+                invalid.append((index, error.errors(include_url=False, include_context=False, include_input=False)))
+
+        if len(valid) + len(invalid) >= chunk_size:
+            yield valid, invalid
+            valid, invalid = [], []
+
+    if valid or invalid:
+        yield valid, invalid
+
+
+def bulk_openapi_body(schema: type[BaseModel]) -> dict:
+    # Request 를 직접 읽는 엔드포인트라서 OpenAPI 문서에 body 형태를 직접 적어준다.
+    row_schema = schema.model_json_schema()
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": row_schema}},
+                NDJSON_MEDIA_TYPE: {"schema": row_schema},
+            },
+        }
+    }
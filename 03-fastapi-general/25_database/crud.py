@@ -1,45 +1,297 @@
-from sqlalchemy.orm import Session
+from functools import lru_cache
+
+from pydantic import BaseModel
+from sqlalchemy import select, tuple_, insert, or_, and_, bindparam, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
 from models import User, Item
-from schemas import UserCreate, ItemCreate
+from projection import projection_columns, build_projected
+from row_counts import increment_row_count
+from search import search_scores
+from schemas import UserCreate, ItemCreate, ItemBulkCreate
+
+
+# <미리 만들어 둔 statement>
+# - 요청마다 select(...).where(...) 를 새로 만들면, 실행할 때 SQLAlchemy 가 statement 를 훑어서 cache key 를 계산해야
+#   compiled cache 에서 SQL 문자열을 찾을 수 있다. 자주 불리는 조회에서는 이 "statement 생성 + cache key 계산" 이 호출당 오버헤드다.
+# - 값이 들어갈 자리는 bindparam 으로 비워둔 statement 를 (응답 스키마, 분기) 조합마다 한 번만 만들고 실행할 때 값만 넘긴다.
+#   statement 객체의 cache key 는 객체에 memoize 되므로 두 번째 호출부터는 생성도 cache key 계산도 없다.
+# - lambda_stmt 도 같은 목적이지만, SQLAlchemy 2.x 에서는 실행할 때마다 statement 를 복제해서 값을 채우느라 오히려 느렸다.
+#   (bench_statement_cache.py)
+def _select_for(model, load_for: type[BaseModel] | None):
+    return select(*projection_columns(load_for, model)) if load_for else select(model)
+
+
+@lru_cache
+def _user_by_id_statement(load_for: type[BaseModel] | None):
+    return _select_for(User, load_for).where(User.id == bindparam("user_id"))
+
+
+_USER_BY_EMAIL_STATEMENT = select(User).where(User.email == bindparam("email"))
+
+
+# 페이지 쿼리에 붙이는 전체 개수 컬럼. window 함수는 LIMIT / OFFSET 전에 계산되므로 WHERE 에 걸린 전체 row 수다.
+def _with_total(query):
+    return query.add_columns(func.count().over().label("total_count"))
+
+
+def _page_result(rows: list, items: list, with_total: bool):
+    # with_total 이면 (items, 전체 개수) 를 리턴한다. 페이지가 비어서 개수를 읽지 못했으면 None
+    if with_total:
+        return items, rows[0].total_count if rows else None
+    return items
+
+
+@lru_cache
+def _users_page_statement(load_for: type[BaseModel] | None, keyset: bool, with_total: bool = False):
+    query = _select_for(User, load_for).order_by(User.id).limit(bindparam("limit"))
+    if with_total:
+        query = _with_total(query)
+    if keyset:
+        return query.where(User.id > bindparam("after_id"))
+    return query.offset(bindparam("skip"))
 
 
 # Read User
 # - SQLAlchemy model 을 사용한다. "DB 에서 부터" 데이터를 읽는 과정이기 때문이다.
-def get_user(db: Session, user_id: int):
-    return db.query(User).filter(User.id == user_id).first()
+# - load_for 에 응답 스키마를 넘기면 ORM entity 대신 그 스키마에 필요한 컬럼만 읽어서 스키마 객체로 돌려준다.
+#   (hashed_password 같은 응답에 안 나가는 컬럼은 읽지 않는다. relationship 필드는 IN 쿼리 1번으로 같이 가져온다.)
+# - items_limit: 응답 스키마에 items 가 있으면 id 순서로 최대 이만큼만 붙인다. (item 이 아주 많은 유저)
+async def get_user(db: AsyncSession, user_id: int, load_for: type[BaseModel] | None = None,
+                   items_limit: int | None = None):
+    result = await db.execute(_user_by_id_statement(load_for), {"user_id": user_id})
+    if load_for:
+        return next(iter(await build_projected(db, load_for, User, result.all(), relation_limit=items_limit)), None)
+    return result.scalars().first()
+
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(_USER_BY_EMAIL_STATEMENT, {"email": email})
+    return result.scalars().first()
 
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+# <Keyset (cursor) pagination>
+# - offset 은 앞의 skip 개 row 를 읽고 버리기 때문에 뒤 페이지로 갈수록 느려진다.
+# - after_id 가 있으면 "마지막으로 본 id 보다 큰 row" 부터 읽는다. PK 인덱스에서 바로 시작 위치를 찾으므로 페이지 깊이와 상관없다.
+# - skip 은 호환성을 위해 남겨둔다. after_id 가 있으면 무시한다.
+# - with_total: 같은 쿼리로 전체 개수 (count(*) OVER ()) 를 같이 읽어서 (users, 전체 개수) 를 리턴한다.
+#   after_id 가 있으면 cursor 뒤에 남은 row 수가 되므로 첫 페이지 / offset 페이지에서만 쓴다.
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: int | None = None,
+                    load_for: type[BaseModel] | None = None, with_total: bool = False,
+                    items_limit: int | None = None):
+    if after_id is not None:
+        params = {"limit": limit, "after_id": after_id}
+    else:
+        params = {"limit": limit, "skip": skip}
 
+    rows = (await db.execute(_users_page_statement(load_for, after_id is not None, with_total), params)).all()
+    if load_for:
+        return _page_result(rows, await build_projected(db, load_for, User, rows, relation_limit=items_limit),
+                            with_total)
+    return _page_result(rows, [row[0] for row in rows], with_total)
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(User).offset(skip).limit(limit).all()
+
+def fake_hash_password(password: str) -> str:
+    return password + "not-really-hashed"
+
+
+def _insert_ignoring_conflicts(db: AsyncSession, model, index_elements: list[str]):
+    # INSERT ... ON CONFLICT (...) DO NOTHING. 지원하지 않는 DB 면 None.
+    # - SQLite 는 3.35 부터 ON CONFLICT ... RETURNING 을 지원한다.
+    dialect_name = db.bind.dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    if dialect_name == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    return None
 
 
 # Create User
 # - Pydantic model 을 사용한다. "API 요청으로 부터" 온 데이터 이기 때문이다.
-def create_user(db: Session, user: UserCreate):
-    fake_hashed_password = user.password + "not-really-hashed"
-    db_user = User(email=user.email, hashed_password=fake_hashed_password)
+# - "email 로 조회 -> 없으면 INSERT -> refresh" 는 DB 왕복이 3번이고, 동시에 같은 email 로 가입하면 둘 다 조회를 통과할 수 있다.
+# - INSERT ... ON CONFLICT (email) DO NOTHING RETURNING 한 문장으로 처리한다.
+#   row 가 돌아오지 않으면 이미 있는 email 이다. -> None 리턴
+# - ON CONFLICT 를 지원하지 않는 DB 는 그냥 INSERT 하고 unique 제약 위반 (IntegrityError) 을 잡는다. 역시 한 문장이다.
+async def create_user(db: AsyncSession, user: UserCreate) -> User | None:
+    row = {"email": user.email, "hashed_password": fake_hash_password(user.password), "is_active": True}
+    statement = _insert_ignoring_conflicts(db, User, ["email"])
+    try:
+        result = await db.scalars((statement if statement is not None else insert(User)).values(**row).returning(User))
+        db_user = result.first()
+        if db_user is not None:
+            await increment_row_count(db, User)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return None
 
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    if db_user is None:
+        return None
+    # 새 유저는 item 이 없으므로 빈 리스트로 채워서 응답 직렬화 시 lazy-loading 이 일어나지 않게 한다.
+    set_committed_value(db_user, "items", [])
     return db_user
 
 
+@lru_cache
+def _items_page_statement(load_for: type[BaseModel] | None, sort: str, keyset: bool, with_total: bool = False):
+    query = _select_for(Item, load_for)
+    if with_total:
+        query = _with_total(query)
+    if sort == "title":
+        query = query.order_by(Item.title, Item.id)
+        if keyset:
+            query = query.where(tuple_(Item.title, Item.id) > tuple_(bindparam("after_title"), bindparam("after_id")))
+    else:
+        query = query.order_by(Item.id)
+        if keyset:
+            query = query.where(Item.id > bindparam("after_id"))
+
+    query = query.limit(bindparam("limit"))
+    return query if keyset else query.offset(bindparam("skip"))
+
+
 # Read Item
-def get_items(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Item).offset(skip).limit(limit).all()
+# - sort="title" 이면 (title, id) 순서로 정렬하고, after 에는 마지막 row 의 (title, id) 가 온다.
+#   (title, id) 복합 인덱스 (ix_items_title_id) 를 그대로 따라가며 읽는다.
+# - with_total 은 get_users 와 같다.
+async def get_items(db: AsyncSession, skip: int = 0, limit: int = 100, sort: str = "id", after: tuple | None = None,
+                    load_for: type[BaseModel] | None = None, with_total: bool = False):
+    params = {"limit": limit}
+    if after is None:
+        params["skip"] = skip
+    elif sort == "title":
+        params["after_title"], params["after_id"] = after
+    else:
+        params["after_id"] = after[0]
+
+    rows = (await db.execute(_items_page_statement(load_for, sort, after is not None, with_total), params)).all()
+    if load_for:
+        return _page_result(rows, await build_projected(db, load_for, Item, rows), with_total)
+    return _page_result(rows, [row[0] for row in rows], with_total)
+
+
+@lru_cache
+def _owner_items_statement(load_for: type[BaseModel] | None, keyset: bool):
+    query = (_select_for(Item, load_for)
+             .where(Item.owner_id == bindparam("owner_id"))
+             .order_by(Item.id)
+             .limit(bindparam("limit")))
+    if keyset:
+        return query.where(Item.id > bindparam("after_id"))
+    return query
+
+
+# Read User's Items
+# - 한 유저의 item 을 id 순서로 limit 개씩 읽는다. after_id 는 마지막으로 본 item id (cursor)
+# - (owner_id, id) 복합 인덱스 (ix_items_owner_id_id) 에서 (owner_id, after_id) 바로 다음부터 limit 개만 읽는다.
+#   유저의 item 이 몇 개든, 몇 번째 페이지든 읽는 양이 같다.
+async def get_user_items(db: AsyncSession, owner_id: int, limit: int = 100, after_id: int | None = None,
+                         load_for: type[BaseModel] | None = None):
+    params = {"owner_id": owner_id, "limit": limit}
+    if after_id is not None:
+        params["after_id"] = after_id
+
+    result = await db.execute(_owner_items_statement(load_for, after_id is not None), params)
+    if load_for:
+        return await build_projected(db, load_for, Item, result.all())
+    return result.scalars().all()
+
+
+# Search Item
+# - 전문 검색 인덱스로 찾은 (id, score) 를 items 와 join 해서 관련도 순 (score DESC, id ASC) 으로 읽는다.
+# - after 에는 마지막 row 의 (score, id) 가 온다. 페이지 사이에 row 가 바뀌지 않으면 같은 검색어의 score 는 같으므로 keyset 으로 이어서 읽는다.
+#   SQLite 의 bm25 는 전체 문서 수 / 평균 길이 같은 corpus 통계에 따라 달라지므로, 그 사이에 item 이 추가 / 수정되면
+#   score 가 바뀌어서 다음 페이지에서 row 가 빠지거나 겹칠 수 있다. (Postgres 의 ts_rank + similarity 는 row 만 보고 계산한다)
+# - (결과 item 리스트, 각 item 의 score 리스트) 를 리턴한다.
+async def search_items(db: AsyncSession, q: str, limit: int = 100, after: tuple | None = None,
+                       load_for: type[BaseModel] | None = None):
+    scores = search_scores(db.bind.dialect.name, q).subquery("scores")
+    # 한 페이지의 (id, score) 를 먼저 정하고 그 row 들만 items 와 join 한다. (매칭된 row 전체를 join 하지 않는다)
+    page = select(scores.c.id, scores.c.score).order_by(scores.c.score.desc(), scores.c.id).limit(limit)
+    if after is not None:
+        after_score, after_id = after
+        page = page.where(or_(scores.c.score < after_score,
+                              and_(scores.c.score == after_score, scores.c.id > after_id)))
+    page = page.subquery("page")
+
+    columns = projection_columns(load_for, Item) if load_for else (Item,)
+    query = (select(*columns, page.c.score)
+             .join(page, Item.id == page.c.id)
+             .order_by(page.c.score.desc(), Item.id))
+    rows = (await db.execute(query)).all()
+    item_scores = [row.score for row in rows]
+    if load_for:
+        return await build_projected(db, load_for, Item, rows), item_scores
+    return [row.Item for row in rows], item_scores
+
+
+# Export Item
+# - yield_per: DB 드라이버의 server-side cursor (asyncpg 는 portal, sqlite 는 fetchmany) 로 batch_size 개씩 가져온다.
+#   결과 전체를 한 번에 버퍼링하지 않으므로 테이블 전체를 읽어도 메모리는 batch 하나 크기다.
+async def iter_item_batches(db: AsyncSession, columns: tuple[str, ...], batch_size: int = 1000):
+    query = select(*[getattr(Item, column) for column in columns]).order_by(Item.id)
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield rows
 
 
 # Create Item
-def create_item(db: Session, item: ItemCreate, user_id: int):
+async def create_item(db: AsyncSession, item: ItemCreate, user_id: int):
     db_item = Item(**item.model_dump(), owner_id=user_id)
 
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await increment_row_count(db, Item)
+    await db.commit()
+    await db.refresh(db_item)
     return db_item
+
+
+
+# <Bulk insert>
+# - row 마다 add + commit + refresh 를 하면 row 1개에 DB 왕복이 3번이다.
+# - 여러 row 를 multi-row INSERT ... RETURNING 으로 한 번에 넣고 chunk 단위로 한 번만 commit 한다.
+async def create_users_bulk(db: AsyncSession, users: list[UserCreate]) -> dict[str, int]:
+    # 새로 만들어진 유저만 {email: id} 로 리턴한다. 이미 있는 email 은 빠진다.
+    rows = [{"email": user.email, "hashed_password": fake_hash_password(user.password), "is_active": True}
+            for user in users]
+    statement = _insert_ignoring_conflicts(db, User, ["email"])
+    if statement is None:
+        # ON CONFLICT 가 없으면 이미 있는 email 과 chunk 안의 중복 email 을 미리 걸러낸다.
+        emails = [row["email"] for row in rows]
+        seen = set((await db.execute(select(User.email).where(User.email.in_(emails)))).scalars())
+        unique_rows = []
+        for row in rows:
+            if row["email"] not in seen:
+                seen.add(row["email"])
+                unique_rows.append(row)
+        rows = unique_rows
+        statement = insert(User)
+    if not rows:
+        return {}
+
+    result = await db.execute(statement.values(rows).returning(User.id, User.email))
+    created = {email: user_id for user_id, email in result.all()}
+    await increment_row_count(db, User, len(created))
+    await db.commit()
+    return created
+
+
+async def get_existing_user_ids(db: AsyncSession, user_ids: set[int]) -> set[int]:
+    result = await db.execute(select(User.id).where(User.id.in_(user_ids)))
+    return set(result.scalars())
+
+
+async def create_items_bulk(db: AsyncSession, items: list[ItemBulkCreate]) -> list[int]:
+    # sort_by_parameter_order=True: RETURNING 으로 받은 id 가 입력 row 순서와 같도록 보장한다.
+    # SQLAlchemy 가 executemany 를 multi-row INSERT ... VALUES (...), (...) RETURNING 문으로 묶어서 보낸다.
+    if not items:
+        return []
+    result = await db.execute(insert(Item).returning(Item.id, sort_by_parameter_order=True),
+                              [item.model_dump() for item in items])
+    item_ids = list(result.scalars())
+    await increment_row_count(db, Item, len(item_ids))
+    await db.commit()
+    return item_ids
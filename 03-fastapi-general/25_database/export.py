@@ -0,0 +1,43 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterable
+
+from bulk import NDJSON_MEDIA_TYPE
+from crud import iter_item_batches
+from database import replica_router
+from schemas import Item
+
+CSV_MEDIA_TYPE = "text/csv"
+EXPORT_MEDIA_TYPES = {"ndjson": NDJSON_MEDIA_TYPE, "csv": CSV_MEDIA_TYPE}
+
+# 응답 스키마 (Item) 필드 순서 그대로 내보낸다.
+EXPORT_COLUMNS = tuple(Item.model_fields)
+
+
+def encode_ndjson(rows: Iterable[tuple]) -> bytes:
+    return "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, separators=(",", ":")) + "\n"
+                   for row in rows).encode()
+
+
+def encode_csv(rows: Iterable[tuple], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+# <Items export 스트림>
+# - get_items 처럼 전체 결과를 list 로 만들지 않고, server-side cursor 로 batch_size 개씩 읽어서 바로 인코딩해서 보낸다.
+#   메모리에는 batch 하나 (row tuple + 인코딩된 bytes) 만 있으므로 테이블 크기와 상관없이 일정하다.
+# - 세션은 요청 의존성 (get_db) 이 아니라 여기서 직접 연다. StreamingResponse 는 엔드포인트 함수가 리턴한 뒤에 body 를 보내는데,
+#   그때는 의존성의 세션이 이미 닫혀 있다. 세션 / 커넥션은 마지막 batch 를 보낼 때까지 잡고 있다가 스트림이 끝나면 반납한다.
+async def stream_items_export(export_format: str, batch_size: int) -> AsyncIterator[bytes]:
+    # 테이블 전체를 오래 읽는 쿼리라서 replica 로 보낸다.
+    async with replica_router.choose()() as db:
+        if export_format == "csv":
+            yield encode_csv((), header=True)
+        async for rows in iter_item_batches(db, EXPORT_COLUMNS, batch_size):
+            yield encode_ndjson(rows) if export_format == "ndjson" else encode_csv(rows)
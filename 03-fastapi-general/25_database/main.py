@@ -1,62 +1,381 @@
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Literal
+
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+from anyio import to_thread
+from fastapi import FastAPI, Depends, HTTPException, Response, Request, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from crud import get_user_by_email, get_users, get_user, create_item, get_items
+from bulk import iter_validated_chunks, bulk_openapi_body
+from crud import get_user, get_users, get_user_items, create_item, get_items
+from crud import create_users_bulk, create_items_bulk, get_existing_user_ids, search_items
 from crud import create_user as crud_create_user
-from database import engine, Base, SessionLocal
-from schemas import UserCreate, ItemCreate, User, Item
+from database import engine, replica_engines, all_engines, SessionLocal, replica_router, warm_up_pool, pool_stats
+from export import stream_items_export, EXPORT_MEDIA_TYPES
+from pagination import encode_cursor, decode_cursor, InvalidCursor
+from query_counter import CompiledCacheStats
+from row_counts import TotalCounts
+from search import MIN_TERM_LENGTH, search_terms
+from schema_init import init_schema, check_schema
+from models import User as UserModel, Item as ItemModel
+from schemas import UserCreate, ItemCreate, User, UserSummary, Item, ItemBulkCreate, BulkRowResult, BulkCreateResult
+from user_cache import UserCache, CacheBackend, InMemoryCacheBackend, RedisCacheBackend
+from write_batcher import ItemWriteBatcher
+
+logger = logging.getLogger(__name__)
+
+# Bulk 생성 시 한 번에 검증 / INSERT / commit 하는 row 수
+BULK_CHUNK_SIZE = 1000
+
+# <Read-your-writes>
+# - replica 는 primary 보다 조금 늦게 반영된다. 방금 쓴 클라이언트가 바로 읽으면 자기가 쓴 데이터가 안 보일 수 있다.
+# - 쓰기 요청을 한 클라이언트에게 "이 시각까지는 primary 에서 읽기" cookie 를 준다. 그동안 그 클라이언트의 읽기는 primary 로 간다.
+# - 기간은 replica lag 보다 넉넉하게 잡는다.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+READ_YOUR_WRITES_COOKIE = "db_primary_until"
+
+# <Item 쓰기 group commit>
+# - ITEM_WRITE_BATCHING=true 이면 POST /users/{user_id}/items/ 요청들을 모아서 한 트랜잭션으로 commit 한다. (write_batcher.py)
+# - window 만큼 지연시간이 늘어나는 대신, 동시 쓰기가 많을 때 commit 횟수가 줄어서 throughput 이 늘어난다.
+ITEM_WRITE_BATCHING = os.getenv("ITEM_WRITE_BATCHING", "false").lower() == "true"
+ITEM_WRITE_BATCH_WINDOW_MS = float(os.getenv("ITEM_WRITE_BATCH_WINDOW_MS", "2"))
+ITEM_WRITE_BATCH_MAX_SIZE = int(os.getenv("ITEM_WRITE_BATCH_MAX_SIZE", "128"))
+
+# /items/export 에서 한 번에 DB 에서 읽고 인코딩하는 row 수
+EXPORT_BATCH_SIZE = 1000
+
+# <유저 응답의 items>
+# - item 이 아주 많은 유저는 응답에 item 전체가 붙으면 응답이 너무 커진다.
+# - items_limit=n 이면 id 순서로 최대 n 개만 붙이고, items_limit=0 이면 items 필드를 뺀 응답 (UserSummary) 을 준다.
+#   (주지 않으면 이전처럼 전부 붙인다)
+# - 나머지 item 은 GET /users/{user_id}/items 에서 cursor 로 페이지 단위로 읽는다. 한 페이지는 최대 USER_ITEMS_MAX_PAGE_SIZE 개
+EMBEDDED_ITEMS_MAX = 100
+USER_ITEMS_MAX_PAGE_SIZE = 1000
+
+# 유저 조회 캐시. USER_CACHE_REDIS_URL 이 있으면 워커들이 Redis 를 공유하고, 없으면 워커마다 in-process 캐시를 쓴다.
+USER_CACHE_REDIS_URL = os.getenv("USER_CACHE_REDIS_URL")
+USER_CACHE_MAXSIZE = 10_000
+# 캐시는 primary 에서 읽은 값으로만 채우고 쓰기마다 무효화한다. TTL 은 다른 워커의 in-process 캐시가 늦은 값을 보여줘도 되는 시간이다.
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_NEGATIVE_TTL_SECONDS = 5
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # async engine 은 import 시점에 연결할 수 없으므로 시작할 때 테이블을 만든다.
+    # - 저장된 schema fingerprint 가 지금 모델과 같으면 테이블 / 인덱스 확인을 건너뛴다. (schema_init.py)
+    async with engine.begin() as connection:
+        await connection.run_sync(init_schema)
+    # - replica 는 읽기 전용이므로 DDL / fingerprint 쓰기를 하지 않고, primary 에서 복제된 fingerprint 를 비교만 한다.
+    #   (로컬 SQLite replica 는 복제되지 않는 별개의 파일이라서 primary 처럼 여기서 만든다)
+    for replica in replica_engines:
+        if replica.dialect.name == "sqlite":
+            async with replica.begin() as connection:
+                await connection.run_sync(init_schema)
+            continue
+        async with replica.connect() as connection:
+            if not await connection.run_sync(check_schema):
+                logger.warning("Schema fingerprint on replica %s does not match the models yet (replication lag?)",
+                               replica.url.render_as_string(hide_password=True))
+    # 배포 직후 첫 요청들이 커넥션 생성 (TCP + TLS + 인증) 지연을 겪지 않도록 pool 을 미리 채운다.
+    for target in all_engines:
+        await warm_up_pool(target)
+    if item_write_batcher:
+        item_write_batcher.start()
+    yield
+    if item_write_batcher:
+        await item_write_batcher.close()
+    # 종료할 때 pool 의 커넥션을 모두 닫는다. (DB 쪽에 끊긴 세션이 남지 않게)
+    for target in all_engines:
+        await target.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# crud 의 미리 만들어 둔 statement 들이 compiled cache 를 잘 타고 있는지 /admin/statement-cache 로 본다.
+compiled_cache_stats = CompiledCacheStats(all_engines)
+
+
+def build_user_cache_backend() -> CacheBackend:
+    if USER_CACHE_REDIS_URL:
+        # redis 패키지는 공유 저장소를 쓸 때만 필요하다.
+        from redis import asyncio as redis_asyncio
+        return RedisCacheBackend(redis_asyncio.from_url(USER_CACHE_REDIS_URL))
+    return InMemoryCacheBackend(maxsize=USER_CACHE_MAXSIZE)
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+user_cache = UserCache(build_user_cache_backend(),
+                       ttl_seconds=USER_CACHE_TTL_SECONDS,
+                       negative_ttl_seconds=USER_CACHE_NEGATIVE_TTL_SECONDS)
+
+item_write_batcher = ItemWriteBatcher(SessionLocal,
+                                      window_seconds=ITEM_WRITE_BATCH_WINDOW_MS / 1000,
+                                      max_batch_size=ITEM_WRITE_BATCH_MAX_SIZE) if ITEM_WRITE_BATCHING else None
+
+
+# 목록 엔드포인트의 total 파라미터. 어떤 방법으로 센 개수인지는 응답의 X-Total-Count-Kind 로 알려준다. (row_counts.py)
+TotalCountKind = Literal["exact", "estimate", "counter"]
+total_counts = TotalCounts()
+
+
+async def resolve_total_count(db: AsyncSession, model, kind: TotalCountKind | None,
+                              first_page: bool) -> tuple[str | None, bool]:
+    # (실제로 쓸 kind, 페이지 쿼리에 count(*) OVER () 를 붙일지)
+    # - cursor 페이지에서 window count 는 cursor 뒤에 남은 row 수이므로 첫 페이지 / offset 페이지에서만 붙인다.
+    if kind is None:
+        return None, False
+    kind = await total_counts.resolve_kind(db, model, kind)
+    return kind, kind == "exact" and first_page
+
+
+async def set_total_count_headers(response: Response, db: AsyncSession, model, kind: str | None,
+                                  count: int | None) -> None:
+    if kind is None:
+        return
+    if count is None:
+        count, kind = await total_counts.count(db, model, kind)
+    response.headers["X-Total-Count"] = str(count)
+    response.headers["X-Total-Count-Kind"] = kind
+
+
+def decode_cursor_or_400(cursor: str, sort: str, key_types: tuple = ()) -> tuple:
+    try:
+        return decode_cursor(cursor, sort, key_types)
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
+# - get_db: 쓰기용. 항상 primary 세션이다. read-your-writes cookie 를 갱신한다.
+# - get_read_db: 읽기 전용 엔드포인트용. replica 세션이다. read-your-writes 기간 안이면 primary 세션이다.
+async def get_db(response: Response):
+    primary_until = time.time() + READ_YOUR_WRITES_SECONDS
+    response.set_cookie(READ_YOUR_WRITES_COOKIE, f"{primary_until:.3f}",
+                        max_age=max(1, round(READ_YOUR_WRITES_SECONDS)), httponly=True, samesite="lax")
+    async with SessionLocal() as db:
+        yield db
+
+
+async def get_read_db(request: Request):
     try:
+        primary_until = float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0))
+    except ValueError:
+        primary_until = 0.0
+    # cookie 는 클라이언트가 보낸 값이라서 믿지 않는다. 우리가 줄 수 있는 최대값 (지금 + READ_YOUR_WRITES_SECONDS) 보다 크면
+    # 위조된 값이므로 무시한다. (e.g. db_primary_until=1e300 으로 모든 읽기를 primary 로 보내고 캐시를 건너뛰기)
+    now = time.time()
+    read_your_writes = now < primary_until <= now + READ_YOUR_WRITES_SECONDS
+    session_factory = replica_router.use_primary() if read_your_writes else replica_router.choose()
+    async with session_factory() as db:
+        # 방금 쓴 클라이언트는 캐시도 건너뛰고 primary 에서 읽는다. (user_cache.py 참고)
+        db.info["read_your_writes"] = read_your_writes
         yield db
-    finally:
-        db.close()
 
 
 @app.post("/users/", response_model=User, status_code=status.HTTP_201_CREATED, tags=["Users"])
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    # 유저가 존재하면 raise exception
-    # 아니면 생성
-    db_user = get_user_by_email(db, email=user.email)
-    if db_user:
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    # 유저를 생성하고, 이미 존재하는 email 이면 (생성되지 않았으면) raise exception
+    # - 조회 후 생성하지 않고 INSERT ... ON CONFLICT 한 번으로 처리한다. (동시 가입 race 없음)
+    created_user = await crud_create_user(db, user)
+    if not created_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already exists")
-    created_user = crud_create_user(db, user)
+    # 생성 전에 조회해서 캐시된 "없음" 엔트리를 지운다.
+    await user_cache.invalidate_users(user_ids=[created_user.id], emails=[created_user.email])
     return created_user
 
 
-@app.get("/users/", response_model=list[User], status_code=status.HTTP_200_OK, tags=["Users"])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_users = get_users(db, skip, limit)
+# <Bulk create>
+# - JSON 배열 또는 NDJSON 스트림을 받아서 BULK_CHUNK_SIZE 개씩 검증 -> multi-row INSERT ... RETURNING -> commit 한다.
+# - 일부 row 가 실패해도 나머지는 저장되고, row 마다 결과 (id 또는 에러) 를 입력 순서대로 돌려준다.
+@app.post("/users/bulk", response_model=BulkCreateResult, tags=["Users"],
+          openapi_extra=bulk_openapi_body(UserCreate))
+async def create_users_in_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    results: list[BulkRowResult] = []
+    async for valid, invalid in iter_validated_chunks(request, UserCreate, BULK_CHUNK_SIZE):
+        results += [BulkRowResult(index=index, status="error", detail=detail) for index, detail in invalid]
+
+        created = await create_users_bulk(db, [user for _, user in valid])
+        await user_cache.invalidate_users(user_ids=created.values(), emails=created.keys())
+        for index, user in valid:
+            # 같은 email 이 chunk 안에 여러 번 있으면 첫 row 만 생성된다.
+            user_id = created.pop(user.email, None)
+            if user_id is None:
+                results.append(BulkRowResult(index=index, status="error", detail="Email already exists"))
+            else:
+                results.append(BulkRowResult(index=index, status="created", id=user_id))
+
+    return bulk_result(results)
+
+
+@app.post("/items/bulk", response_model=BulkCreateResult, tags=["Items"],
+          openapi_extra=bulk_openapi_body(ItemBulkCreate))
+async def create_items_in_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    results: list[BulkRowResult] = []
+    async for valid, invalid in iter_validated_chunks(request, ItemBulkCreate, BULK_CHUNK_SIZE):
+        results += [BulkRowResult(index=index, status="error", detail=detail) for index, detail in invalid]
+
+        # owner 가 없는 row 는 INSERT 전에 걸러낸다. (FK 에러 하나로 chunk 전체가 실패하지 않도록)
+        owner_ids = await get_existing_user_ids(db, {item.owner_id for _, item in valid})
+        insertable = []
+        for index, item in valid:
+            if item.owner_id in owner_ids:
+                insertable.append((index, item))
+            else:
+                results.append(BulkRowResult(index=index, status="error", detail="Owner not found"))
+
+        item_ids = await create_items_bulk(db, [item for _, item in insertable])
+        await user_cache.invalidate_users(user_ids={item.owner_id for _, item in insertable})
+        results += [BulkRowResult(index=index, status="created", id=item_id)
+                    for (index, _), item_id in zip(insertable, item_ids)]
+
+    return bulk_result(results)
+
+
+def bulk_result(results: list[BulkRowResult]) -> BulkCreateResult:
+    results.sort(key=lambda result: result.index)
+    created = sum(1 for result in results if result.status == "created")
+    return BulkCreateResult(created=created, failed=len(results) - created, results=results)
+
+
+def user_schema(items_limit: int | None) -> type[User] | type[UserSummary]:
+    return UserSummary if items_limit == 0 else User
+
+
+@app.get("/users/", response_model=list[User | UserSummary], status_code=status.HTTP_200_OK, tags=["Users"])
+async def read_users(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None,
+                     total: TotalCountKind | None = None,
+                     items_limit: int | None = Query(None, ge=0, le=EMBEDDED_ITEMS_MAX),
+                     db: AsyncSession = Depends(get_read_db)):
+    # cursor 가 있으면 keyset pagination, 없으면 기존 offset pagination
+    # - 다음 페이지가 있을 수 있으면 X-Next-Cursor 헤더로 다음 cursor 를 준다. (응답 body 형태는 그대로)
+    # - total 을 주면 전체 유저 수를 X-Total-Count 헤더로 준다.
+    after_id = decode_cursor_or_400(cursor, "id")[0] if cursor else None
+    total_kind, with_total = await resolve_total_count(db, UserModel, total, first_page=after_id is None)
+    result = await get_users(db, skip, limit, after_id=after_id, load_for=user_schema(items_limit),
+                             with_total=with_total, items_limit=items_limit)
+    db_users, count = result if with_total else (result, None)
+    await set_total_count_headers(response, db, UserModel, total_kind, count)
+    if db_users and len(db_users) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor("id", db_users[-1].id)
     return db_users
 
 
-@app.get("/users/{user_id}", response_model=User, status_code=status.HTTP_200_OK,tags=["Users"])
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = get_user(db, user_id)
+@app.get("/users/{user_id}", response_model=User | UserSummary, status_code=status.HTTP_200_OK,tags=["Users"])
+async def read_user(user_id: int, items_limit: int | None = Query(None, ge=0, le=EMBEDDED_ITEMS_MAX),
+                    db: AsyncSession = Depends(get_read_db)):
+    if items_limit is None:
+        db_user = await user_cache.get_user(db, user_id, load_for=User)
+    else:
+        # 캐시에는 item 을 전부 붙인 응답만 둔다. 잘린 응답은 PK 조회 + 인덱스에서 n 개만 읽으므로 DB 에서 바로 읽는다.
+        db_user = await get_user(db, user_id, load_for=user_schema(items_limit), items_limit=items_limit)
     # 항상 exception handling 을 생각해서 코드 작성 해야함
     if not db_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return db_user
 
 @app.post("/users/{user_id}/items/", response_model=Item, tags=["Items"])
-def create_item_for_user(user_id: int, item: ItemCreate, db: Session = Depends(get_db)):
-    created_item = create_item(db, item, user_id)
+async def create_item_for_user(user_id: int, item: ItemCreate, db: AsyncSession = Depends(get_db)):
+    if item_write_batcher:
+        created_item = await item_write_batcher.submit(item, user_id)
+    else:
+        created_item = await create_item(db, item, user_id)
+    # 유저 응답에 items 가 포함되므로 owner 의 캐시 엔트리를 지운다.
+    await user_cache.invalidate_users(user_ids=[user_id])
     return created_item
 
+# <유저별 item 목록>
+# - 유저의 item 을 id 순서로 limit 개씩 준다. 다음 페이지는 X-Next-Cursor 헤더의 cursor 로 읽는다.
+# - 없는 유저면 404. (item 이 없는 유저는 빈 리스트)
+@app.get("/users/{user_id}/items", response_model=list[Item], tags=["Items"])
+async def read_user_items(response: Response, user_id: int,
+                          limit: int = Query(100, ge=1, le=USER_ITEMS_MAX_PAGE_SIZE), cursor: str | None = None,
+                          db: AsyncSession = Depends(get_read_db)):
+    after_id = decode_cursor_or_400(cursor, "id")[0] if cursor else None
+    db_items = await get_user_items(db, user_id, limit, after_id=after_id, load_for=Item)
+    # 빈 페이지일 때만 유저가 있는지 확인한다. (item 이 하나라도 있으면 유저가 있는 것이다)
+    if not db_items and not await get_existing_user_ids(db, {user_id}):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    if db_items and len(db_items) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor("id", db_items[-1].id)
+    return db_items
+
+
 @app.get("/items/", response_model=list[Item], tags=["Items"])
-def read_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_items = get_items(db,skip,limit)
+async def read_items(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None,
+                     sort: Literal["id", "title"] = "id", total: TotalCountKind | None = None,
+                     db: AsyncSession = Depends(get_read_db)):
+    after = decode_cursor_or_400(cursor, sort, (str,) if sort == "title" else ()) if cursor else None
+    total_kind, with_total = await resolve_total_count(db, ItemModel, total, first_page=after is None)
+    result = await get_items(db, skip, limit, sort=sort, after=after, load_for=Item, with_total=with_total)
+    db_items, count = result if with_total else (result, None)
+    await set_total_count_headers(response, db, ItemModel, total_kind, count)
+    if db_items and len(db_items) == limit:
+        last_item = db_items[-1]
+        if sort == "title":
+            response.headers["X-Next-Cursor"] = encode_cursor(sort, last_item.title, last_item.id)
+        else:
+            response.headers["X-Next-Cursor"] = encode_cursor(sort, last_item.id)
     return db_items
 
 
+# <Items search>
+# - title + description 에서 q 의 키워드를 (부분 문자열로) 모두 포함하는 item 을 관련도 순으로 준다.
+# - 다음 페이지는 /items/ 와 같이 X-Next-Cursor 헤더의 cursor 로 읽는다.
+@app.get("/items/search", response_model=list[Item], tags=["Items"])
+async def search_items_endpoint(response: Response, q: str = Query(min_length=MIN_TERM_LENGTH, max_length=200),
+                                limit: int = Query(20, ge=1, le=100), cursor: str | None = None,
+                                db: AsyncSession = Depends(get_read_db)):
+    # 공백만 있는 q 는 min_length 를 통과하지만 키워드가 없다. (조건 없이 전체 item 을 읽게 된다)
+    if not search_terms(q):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Search query has no terms")
+    after = decode_cursor_or_400(cursor, "search", ((int, float),)) if cursor else None
+    items, scores = await search_items(db, q, limit, after=after, load_for=Item)
+    if items and len(items) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor("search", scores[-1], items[-1].id)
+    return items
+
+
+# <Items export>
+# - 테이블 전체를 NDJSON (한 줄에 item 하나) 또는 CSV 로 내려준다.
+# - batch 단위로 읽고 인코딩해서 바로 보내므로 서버 메모리는 테이블 크기와 상관없이 일정하다. (stream_items_export 참고)
+@app.get("/items/export", tags=["Items"], response_class=StreamingResponse)
+async def export_items(export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format")):
+    return StreamingResponse(stream_items_export(export_format, EXPORT_BATCH_SIZE),
+                             media_type=EXPORT_MEDIA_TYPES[export_format],
+                             headers={"Content-Disposition": f'attachment; filename="items.{export_format}"'})
+
+
+# <DB pool metrics>
+# - checked_out 이 pool_size + max_overflow 에 자주 닿거나 wait_ms 가 커지면 pool 이 작은 것이다.
+# - threadpool_tokens: Starlette threadpool 크기. def 엔드포인트 / 의존성이 DB 를 쓰면 동시에 필요한 커넥션 수의 상한이 된다.
+@app.get("/admin/db-pool", tags=["Admin"])
+async def read_db_pool_metrics() -> dict:
+    return {**pool_stats(), "threadpool_tokens": int(to_thread.current_default_thread_limiter().total_tokens),
+            "replicas": [pool_stats(target) for target in all_engines[1:]],
+            "routing": replica_router.stats()}
+
+
+@app.get("/admin/item-write-batcher", tags=["Admin"])
+async def read_item_write_batcher_metrics() -> dict[str, int | float | bool]:
+    if not item_write_batcher:
+        return {"enabled": False}
+    return {"enabled": True, **item_write_batcher.stats()}
+
+
+@app.get("/admin/statement-cache", tags=["Admin"])
+async def read_statement_cache_metrics() -> dict[str, int | float]:
+    return compiled_cache_stats.stats()
+
+
+@app.get("/admin/user-cache", tags=["Admin"])
+async def read_user_cache_metrics() -> dict[str, int | float | str | None]:
+    return user_cache.stats()
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="localhost", port=8000, reload=True)
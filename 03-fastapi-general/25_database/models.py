@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -12,7 +12,8 @@ class User(Base):
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
 
-    items = relationship("Item", back_populates="owner")
+    # lazy="raise_on_sql": 미리 로딩하지 않은 relationship 에 접근하면 쿼리를 몰래 보내지 않고 에러를 낸다. (N+1 방지)
+    items = relationship("Item", back_populates="owner", lazy="raise_on_sql")
 
 
 class Item(Base):
@@ -20,7 +21,27 @@ class Item(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
-    description = Column(String, index=True)
+    # 부분 문자열 / 키워드 검색은 B-tree 인덱스를 쓰지 못하므로 전문 검색 인덱스 (search.py) 를 쓴다.
+    description = Column(String)
     owner_id = Column(Integer, ForeignKey("users.id"))
 
-    owner = relationship("User", back_populates="items")
+    owner = relationship("User", back_populates="items", lazy="raise_on_sql")
+
+    __table_args__ = (
+        # title 정렬 목록의 keyset pagination: WHERE (title, id) > (:title, :id) ORDER BY title, id
+        Index("ix_items_title_id", "title", "id"),
+        # 유저별 item 목록: WHERE owner_id = :owner_id AND id > :after_id ORDER BY id LIMIT n
+        # 유저 응답에 item 을 붙일 때 (WHERE owner_id IN (...)) 도 이 인덱스를 쓴다.
+        Index("ix_items_owner_id_id", "owner_id", "id"),
+    )
+
+
+# <테이블별 row 수 카운터>
+# - 목록 응답의 X-Total-Count (kind=counter) 에 쓴다. COUNT(*) 없이 테이블당 shard 수만큼의 row 만 읽어서 더한다.
+# - row 를 만드는 쓰기 (create_user / create_item / bulk / group commit) 가 같은 트랜잭션에서 shard 하나의 row_count 를 올린다. (row_counts.py)
+class RowCount(Base):
+    __tablename__ = "row_count_shards"
+
+    table_name = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    row_count = Column(Integer, nullable=False)
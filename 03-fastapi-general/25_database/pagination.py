@@ -0,0 +1,45 @@
+import base64
+import binascii
+import json
+import math
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# cursor 의 정수 값은 BIGINT 범위 안이어야 DB 에 bind 할 수 있다. (밖이면 sqlite 는 OverflowError, asyncpg 는 DataError)
+CURSOR_INT_MIN = -2 ** 63
+CURSOR_INT_MAX = 2 ** 63 - 1
+
+
+# <Opaque cursor>
+# - 마지막으로 받은 row 의 정렬 key 값들을 base64 로 감싼 문자열이다. e.g.) ["title", "수저", 42]
+# - 클라이언트는 내용을 해석하지 않고 다음 요청의 cursor 로 그대로 돌려주기만 한다.
+# - 정렬 기준도 같이 넣어서, 다른 정렬로 만든 cursor 를 섞어 쓰면 거절한다.
+def encode_cursor(sort: str, *values) -> str:
+    raw = json.dumps([sort, *values], separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, sort: str, key_types: tuple = ()) -> tuple:
+    # key_types: id 앞에 오는 정렬 key 값들의 타입. e.g.) title 정렬이면 (str,)
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        decoded = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError) as error:
+        raise InvalidCursor(cursor) from error
+
+    # 마지막 값은 항상 PK (id) 다. 값들은 SQL 에 그대로 bind 되므로 타입이 다르면 (dict, list, bool ...) 거절한다.
+    if not isinstance(decoded, list) or len(decoded) != len(key_types) + 2 or decoded[0] != sort:
+        raise InvalidCursor(cursor)
+    values = decoded[1:]
+    for value, value_type in zip(values, (*key_types, int)):
+        if isinstance(value, bool) or not isinstance(value, value_type):
+            raise InvalidCursor(cursor)
+        if isinstance(value, int) and not CURSOR_INT_MIN <= value <= CURSOR_INT_MAX:
+            raise InvalidCursor(cursor)
+        # json.loads 는 NaN / Infinity 도 받아준다.
+        if isinstance(value, float) and not math.isfinite(value):
+            raise InvalidCursor(cursor)
+    return tuple(values)
@@ -0,0 +1,124 @@
+import types
+import typing
+from collections import defaultdict
+from functools import lru_cache
+
+from pydantic import BaseModel
+from sqlalchemy import inspect, select, union_all, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def nested_schema(annotation) -> type[BaseModel] | None:
+    # list[Item], Item | None 같은 annotation 에서 pydantic 스키마를 꺼낸다.
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    if isinstance(annotation, (types.GenericAlias, types.UnionType)) or typing.get_origin(annotation):
+        for argument in typing.get_args(annotation):
+            nested = nested_schema(argument)
+            if nested:
+                return nested
+    return None
+
+
+class _Relation(typing.NamedTuple):
+    name: str
+    schema: type[BaseModel]
+    model: type
+    parent_key: str  # 부모 row 에서 join 에 쓰는 컬럼 이름 (e.g. users.id)
+    child_key: str  # 자식 row 에서 join 에 쓰는 컬럼 이름 (e.g. items.owner_id)
+    uselist: bool
+
+
+class _Plan(typing.NamedTuple):
+    columns: tuple
+    relations: tuple[_Relation, ...]
+
+
+# <응답 스키마 기반 column projection>
+# - ORM entity 전체 (hashed_password 포함) 를 읽지 않고 응답 스키마 필드에 해당하는 컬럼만 SELECT 한다.
+# - 결과 row tuple 에서 바로 응답 스키마 객체를 만든다. (identity map, 속성 instrumentation, 변경 추적 없음)
+# - 스키마 필드 이름이 relationship 이면 (e.g. User.items) 자식 테이블을 "WHERE 외래키 IN (...)" 쿼리 1번으로 가져와서 붙인다.
+#   selectinload 와 같은 방식이라 부모가 100개여도 쿼리는 2번이다. 중첩 스키마도 재귀적으로 따라간다.
+# - (스키마, 모델) 조합마다 계획이 같으므로 한 번만 계산한다.
+@lru_cache
+def projection_plan(schema: type[BaseModel], model) -> _Plan:
+    mapper = inspect(model)
+    column_names = [name for name in schema.model_fields if name in mapper.column_attrs]
+
+    relations = []
+    for name, field in schema.model_fields.items():
+        relationship = mapper.relationships.get(name)
+        if relationship is None:
+            continue
+        (local_column, remote_column), = relationship.local_remote_pairs
+        relations.append(_Relation(
+            name=name,
+            schema=nested_schema(field.annotation),
+            model=relationship.mapper.class_,
+            parent_key=mapper.get_property_by_column(local_column).key,
+            child_key=relationship.mapper.get_property_by_column(remote_column).key,
+            uselist=relationship.uselist,
+        ))
+
+    # join 때문에 select 해야 하지만 스키마에는 없는 컬럼 (e.g. 스키마에 id 가 없는 경우의 users.id)
+    extra_keys = sorted({relation.parent_key for relation in relations} - set(column_names))
+    columns = tuple(getattr(model, name) for name in [*column_names, *extra_keys])
+    return _Plan(columns=columns, relations=tuple(relations))
+
+
+# relation_limit 을 쓸 때 UNION ALL 한 쿼리에 넣는 부모 수. (SQLite 의 compound SELECT 최대 500개보다 작게)
+RELATION_LIMIT_CHUNK_SIZE = 100
+
+
+def projection_columns(schema: type[BaseModel], model) -> tuple:
+    # crud 에서 select(*projection_columns(...)).where(...) 처럼 쓴다.
+    return projection_plan(schema, model).columns
+
+
+async def _fetch_children(db: AsyncSession, relation: _Relation, parent_keys: set, limit: int | None) -> list:
+    child_key_column = getattr(relation.model, relation.child_key)
+    child_columns = (*projection_columns(relation.schema, relation.model), child_key_column.label("_parent_key"))
+    primary_key = inspect(relation.model).primary_key
+    if limit is None:
+        query = select(*child_columns).where(child_key_column.in_(parent_keys)).order_by(*primary_key)
+        return (await db.execute(query)).all()
+
+    # 부모마다 "WHERE 외래키 = :key ORDER BY pk LIMIT n" 을 UNION ALL 로 묶는다.
+    # 부모마다 (외래키, pk) 인덱스에서 n 개만 읽고 멈추므로 자식이 아주 많은 부모가 있어도 읽는 양이 n 개로 고정된다.
+    # (IN 쿼리 + row_number() 는 부모의 자식을 전부 읽은 뒤에 자른다)
+    child_rows = []
+    parent_keys = sorted(parent_keys)
+    for start in range(0, len(parent_keys), RELATION_LIMIT_CHUNK_SIZE):
+        parts = [select(*child_columns).where(child_key_column == key).order_by(*primary_key).limit(limit)
+                 .subquery().select()
+                 for key in parent_keys[start:start + RELATION_LIMIT_CHUNK_SIZE]]
+        query = union_all(*parts).order_by(literal_column("_parent_key"),
+                                           *[literal_column(column.key) for column in primary_key])
+        child_rows += (await db.execute(query)).all()
+    return child_rows
+
+
+async def build_projected(db: AsyncSession, schema: type[BaseModel], model, rows,
+                          relation_limit: int | None = None) -> list[BaseModel]:
+    # rows: select(*projection_columns(schema, model)) 의 결과
+    # relation_limit: list relationship (e.g. User.items) 을 부모마다 pk 순서로 최대 이만큼만 붙인다. 중첩된 relationship 에는 적용하지 않는다.
+    plan = projection_plan(schema, model)
+    records = [dict(row._mapping) for row in rows]
+
+    for relation in plan.relations:
+        parent_keys = {record[relation.parent_key] for record in records}
+        children = defaultdict(list)
+        if parent_keys:
+            child_rows = await _fetch_children(db, relation, parent_keys, relation_limit if relation.uselist else None)
+            for parent_key, child in zip([row._parent_key for row in child_rows],
+                                         await build_projected(db, relation.schema, relation.model, child_rows)):
+                children[parent_key].append(child)
+
+        for record in records:
+            related = children.get(record[relation.parent_key], [])
+            record[relation.name] = related if relation.uselist else next(iter(related), None)
+
+    # DB 에서 읽은 값이므로 다시 검증하지 않고 바로 만든다.
+    # join 용 컬럼이나 호출한 쪽에서 같이 select 한 값 (e.g. 검색 score) 은 스키마 필드가 아니므로 뺀다.
+    fields = schema.model_fields.keys()
+    return [schema.model_construct(**{key: record[key] for key in fields if key in record}) for record in records]
@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine.interfaces import CacheStats
+
+
+# <쿼리 카운터>
+# - engine 에서 실제로 DB 로 나간 SQL 문을 센다. N+1 회귀를 테스트에서 잡기 위한 도구다.
+# - AsyncEngine 이면 내부 sync_engine 에 이벤트를 건다.
+# 사용 예)
+#     with assert_max_queries(engine, 2):
+#         client.get("/users/?limit=100")
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = getattr(engine, "sync_engine", engine)
+        self.statements: list[str] = []
+
+    def _before_cursor_execute(self, connection, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(engine, expected: int):
+    with QueryCounter(engine) as counter:
+        yield counter
+
+    if counter.count > expected:
+        statements = "\n".join(f"  {index}. {statement}" for index, statement in enumerate(counter.statements, 1))
+        raise AssertionError(f"Expected at most {expected} queries, got {counter.count}:\n{statements}")
+
+
+# <Compiled cache 통계>
+# - 실행된 statement 가 engine 의 compiled cache 에서 SQL 을 찾았는지 (hit) / 새로 컴파일했는지 (miss) 를 센다.
+# - crud 의 미리 만들어 둔 statement 는 첫 실행 이후 hit 이어야 한다. miss 가 계속 늘면 값마다 다른 SQL 이 만들어지고 있다는 뜻이다.
+# - DDL, 문자열 SQL 처럼 cache key 가 없는 statement 는 uncached 로 센다.
+# - QueryCounter 와 달리 앱이 떠 있는 동안 계속 붙어 있는다.
+class CompiledCacheStats:
+    def __init__(self, engines):
+        self.engines = [getattr(engine, "sync_engine", engine) for engine in engines]
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+
+    def _before_cursor_execute(self, connection, cursor, statement, parameters, context, executemany):
+        cache_hit = getattr(context, "cache_hit", None)
+        if cache_hit == CacheStats.CACHE_HIT:
+            self.hits += 1
+        elif cache_hit == CacheStats.CACHE_MISS:
+            self.misses += 1
+        else:
+            self.uncached += 1
+
+    def reset(self) -> None:
+        self.hits = self.misses = self.uncached = 0
+
+    def stats(self) -> dict[str, int | float]:
+        cached = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncached": self.uncached,
+            "hit_ratio": self.hits / cached if cached else 0.0,
+            # engine 마다 compiled cache (LRU) 에 들어 있는 SQL 수
+            "cache_size": sum(len(engine._compiled_cache) for engine in self.engines
+                              if engine._compiled_cache is not None),
+        }
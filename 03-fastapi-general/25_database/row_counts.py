@@ -0,0 +1,118 @@
+import os
+import random
+import time
+
+from sqlalchemy import Connection, func, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import User, Item, RowCount
+
+# <목록의 전체 개수 (X-Total-Count)>
+# - 매 페이지마다 COUNT(*) 를 하면 큰 테이블에서는 페이지 자체보다 개수 세기가 훨씬 느리다. (전체 스캔)
+# - 개수를 세는 방법 (kind)
+#   - exact: 페이지 쿼리에 count(*) OVER () 를 붙여서 쿼리 1번으로 페이지와 개수를 같이 읽는다.
+#     테이블 전체를 세는 것은 같으므로 추정치가 EXACT_COUNT_MAX_ROWS 보다 큰 테이블이면 estimate 로 바꿔서 준다.
+#   - estimate: DB 통계 (Postgres pg_class.reltuples / SQLite ANALYZE 결과) 의 추정치. 통계가 없으면 max(id) 로 추정한다.
+#     프로세스 안에서 COUNT_ESTIMATE_TTL_SECONDS 동안 캐시한다.
+#   - counter: row_count_shards 테이블에 쓰기 때마다 올리는 카운터. shard row 몇 개만 읽으면 되고 추정치보다 정확하다.
+#     카운터가 row 하나면 같은 테이블에 쓰는 트랜잭션들이 그 row 의 lock 을 두고 commit 까지 줄을 선다. (Postgres)
+#     그래서 테이블마다 ROW_COUNT_SHARDS 개의 row 로 나누고, 쓰기마다 임의의 shard 하나만 올린다. 읽을 때는 합친다.
+# - 응답의 X-Total-Count-Kind 헤더로 실제로 어떤 방법으로 센 값인지 알려준다.
+EXACT_COUNT_MAX_ROWS = int(os.getenv("EXACT_COUNT_MAX_ROWS", "10000"))
+COUNT_ESTIMATE_TTL_SECONDS = float(os.getenv("COUNT_ESTIMATE_TTL_SECONDS", "60"))
+# 동시에 쓰는 트랜잭션 수보다 넉넉하게. 값이 schema fingerprint 에 들어가므로 바꾸면 다음 시작 때 없는 shard 를 0 으로 채운다.
+ROW_COUNT_SHARDS = int(os.getenv("ROW_COUNT_SHARDS", "16"))
+
+# row_counts 로 개수를 관리하는 모델
+COUNTED_MODELS = (User, Item)
+
+
+def seed_row_counts(connection: Connection, shards: int | None = None) -> None:
+    # schema 초기화 (schema_init.py) 에서 create_all 다음에 호출한다.
+    # 카운터가 없는 테이블은 shard 0 을 COUNT(*) 로 한 번 채우고, 없는 shard 는 0 으로 만든다.
+    # (increment_row_count 는 UPDATE 라서 row 가 없는 shard 에 올린 값은 사라진다)
+    shards = shards or ROW_COUNT_SHARDS
+    existing = {tuple(row) for row in connection.execute(select(RowCount.table_name, RowCount.shard))}
+    for model in COUNTED_MODELS:
+        table_name = model.__tablename__
+        if (table_name, 0) not in existing:
+            row_count = select(func.count()).select_from(model).scalar_subquery()
+            connection.execute(insert(RowCount).values(table_name=table_name, shard=0, row_count=row_count))
+        missing = [{"table_name": table_name, "shard": shard, "row_count": 0}
+                   for shard in range(1, shards) if (table_name, shard) not in existing]
+        if missing:
+            connection.execute(insert(RowCount), missing)
+
+
+async def increment_row_count(db: AsyncSession, model, count: int = 1) -> None:
+    # commit 전에 같은 트랜잭션 안에서 부른다. INSERT 가 rollback 되면 카운터도 같이 rollback 된다.
+    if count:
+        await db.execute(update(RowCount)
+                         .where(RowCount.table_name == model.__tablename__,
+                                RowCount.shard == random.randrange(ROW_COUNT_SHARDS))
+                         .values(row_count=RowCount.row_count + count))
+
+
+async def get_row_count(db: AsyncSession, model) -> int | None:
+    # 카운터가 아직 없으면 (schema 초기화 전) None
+    return await db.scalar(select(func.sum(RowCount.row_count)).where(RowCount.table_name == model.__tablename__))
+
+
+async def count_rows(db: AsyncSession, model) -> int:
+    return await db.scalar(select(func.count()).select_from(model))
+
+
+async def estimate_rows(db: AsyncSession, model) -> int:
+    table_name = model.__tablename__
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        # 한 번도 ANALYZE 되지 않은 테이블은 -1 (PG 14+) 또는 0 이다.
+        reltuples = await db.scalar(text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table)"),
+                                    {"table": table_name})
+        if reltuples and reltuples > 0:
+            return int(reltuples)
+    elif dialect == "sqlite":
+        # sqlite_stat1 은 ANALYZE 를 한 번이라도 실행해야 생긴다. stat 의 첫 숫자가 테이블 row 수다.
+        analyzed = await db.scalar(text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"))
+        if analyzed:
+            stat = await db.scalar(text("SELECT stat FROM sqlite_stat1 WHERE tbl = :table LIMIT 1"),
+                                   {"table": table_name})
+            if stat:
+                return int(stat.split()[0])
+    # 통계가 없으면 PK 인덱스 끝에서 바로 읽는 max(id) 로 추정한다. (id 는 1 부터 늘어나고 앱은 row 를 지우지 않는다)
+    return await db.scalar(select(func.max(model.id))) or 0
+
+
+class TotalCounts:
+    def __init__(self, exact_max_rows: int = EXACT_COUNT_MAX_ROWS,
+                 estimate_ttl_seconds: float = COUNT_ESTIMATE_TTL_SECONDS):
+        self.exact_max_rows = exact_max_rows
+        self.estimate_ttl_seconds = estimate_ttl_seconds
+        # table 이름 -> (추정치, 만료 시각)
+        self._estimates: dict[str, tuple[int, float]] = {}
+
+    async def estimate(self, db: AsyncSession, model) -> int:
+        now = time.monotonic()
+        cached = self._estimates.get(model.__tablename__)
+        if cached and cached[1] > now:
+            return cached[0]
+        estimate = await estimate_rows(db, model)
+        self._estimates[model.__tablename__] = (estimate, now + self.estimate_ttl_seconds)
+        return estimate
+
+    async def resolve_kind(self, db: AsyncSession, model, kind: str) -> str:
+        # 요청한 kind 를 이 테이블에서 실제로 쓸 kind 로 바꾼다. 큰 테이블의 exact 는 estimate 가 된다.
+        if kind == "exact" and await self.estimate(db, model) > self.exact_max_rows:
+            return "estimate"
+        return kind
+
+    async def count(self, db: AsyncSession, model, kind: str) -> tuple[int, str]:
+        # 페이지 쿼리에서 개수를 같이 읽지 못했을 때 (cursor 페이지, 빈 페이지, estimate / counter) 따로 센다.
+        if kind == "exact":
+            return await count_rows(db, model), kind
+        if kind == "counter":
+            row_count = await get_row_count(db, model)
+            if row_count is not None:
+                return row_count, kind
+        # 카운터가 아직 없으면 (schema 초기화 전) 추정치로 대신한다.
+        return await self.estimate(db, model), "estimate"
@@ -0,0 +1,86 @@
+import hashlib
+import os
+
+from sqlalchemy import Connection, MetaData, Table, Column, Integer, String, select, delete, insert, text
+from sqlalchemy.schema import CreateTable, CreateIndex
+
+from database import Base
+import row_counts
+from row_counts import seed_row_counts
+from search import SQLITE_SEARCH_DDL, POSTGRES_SEARCH_DDL, install_search_index
+
+# <Schema 초기화>
+# - create_all 은 워커가 뜰 때마다 테이블 / 인덱스 수만큼 "있는지 확인" 쿼리를 보낸다. (+ 검색 인덱스 확인)
+#   워커가 많거나 DB 가 멀면 (RTT) 이 확인만으로 cold start 가 늘어난다.
+# - 모델 + 검색 인덱스의 DDL 을 dialect 로 컴파일한 문자열의 해시 (fingerprint) 를 DB 에 저장해 두고,
+#   시작할 때 저장된 값과 같으면 DDL 확인을 건너뛴다. 쿼리 2번 (fingerprint 테이블 확인 + SELECT) 으로 끝난다.
+# - 모델 (또는 ROW_COUNT_SHARDS) 을 바꿔서 배포하면 fingerprint 가 달라지므로 그 배포의 첫 워커가 create_all 을 돌리고 새 fingerprint 를 저장한다.
+# - DDL 과 fingerprint 저장은 primary 에서만 한다. 읽기 전용 replica (Postgres standby) 는 쓰기를 거절하므로
+#   replica 는 check_schema 로 복제된 fingerprint 를 읽어서 비교만 한다.
+# - DB_SCHEMA_INIT
+#   - fingerprint: 위 방식 (기본값)
+#   - always: 매번 create_all + 검색 인덱스 확인 (이전 동작). DB 밖에서 테이블을 지웠을 때처럼 fingerprint 로 알 수 없는 변경이 있을 때
+#   - skip: 아무것도 하지 않는다. 스키마를 migration 도구로 따로 관리할 때
+DB_SCHEMA_INIT = os.getenv("DB_SCHEMA_INIT", "fingerprint")
+SCHEMA_FINGERPRINT_TABLE = "schema_fingerprint"
+
+# 모델의 Base.metadata 와 섞이지 않도록 따로 둔다. (create_all / fingerprint 계산 대상이 아니다)
+fingerprint_table = Table(
+    SCHEMA_FINGERPRINT_TABLE, MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("fingerprint", String, nullable=False),
+)
+
+
+def schema_fingerprint(connection: Connection) -> str:
+    dialect = connection.dialect
+    statements = []
+    for table in Base.metadata.sorted_tables:
+        statements.append(str(CreateTable(table).compile(dialect=dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            statements.append(str(CreateIndex(index).compile(dialect=dialect)))
+    statements += SQLITE_SEARCH_DDL + list(POSTGRES_SEARCH_DDL.values())
+    # shard 수를 늘리면 새 shard row 를 만들어야 하므로 (seed_row_counts) fingerprint 도 달라져야 한다.
+    statements.append(f"-- row_count_shards={row_counts.ROW_COUNT_SHARDS}")
+    return hashlib.sha256("\n".join(statements).encode()).hexdigest()
+
+
+def init_schema(connection: Connection, mode: str = DB_SCHEMA_INIT) -> bool:
+    # lifespan 에서 engine 마다 run_sync 로 호출한다. DDL 확인을 했으면 True
+    if mode == "skip":
+        return False
+    if mode not in ("fingerprint", "always"):
+        raise ValueError(f"Unknown schema init mode: {mode}")
+
+    if connection.dialect.name == "postgresql":
+        # 여러 워커가 동시에 떠도 DDL 확인은 하나씩 한다. 트랜잭션이 끝나면 풀린다.
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": SCHEMA_FINGERPRINT_TABLE})
+
+    fingerprint = schema_fingerprint(connection)
+    fingerprint_table.create(connection, checkfirst=True)
+    if mode == "fingerprint":
+        stored = connection.execute(select(fingerprint_table.c.fingerprint)).scalar()
+        if stored == fingerprint:
+            return False
+
+    Base.metadata.create_all(connection)
+    # create_all 은 이미 있는 테이블에 나중에 추가된 인덱스는 만들지 않는다.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    install_search_index(connection)
+    seed_row_counts(connection)
+    connection.execute(delete(fingerprint_table))
+    connection.execute(insert(fingerprint_table).values(id=1, fingerprint=fingerprint))
+    return True
+
+
+def check_schema(connection: Connection, mode: str = DB_SCHEMA_INIT) -> bool:
+    # replica 용. 읽기만 한다. 저장된 fingerprint 가 지금 모델과 같으면 True (skip 모드면 확인하지 않고 True)
+    # 배포 직후에는 primary 의 새 fingerprint 가 아직 복제되지 않아서 False 일 수 있다.
+    if mode == "skip":
+        return True
+    if not connection.dialect.has_table(connection, SCHEMA_FINGERPRINT_TABLE):
+        return False
+    stored = connection.execute(select(fingerprint_table.c.fingerprint)).scalar()
+    return stored == schema_fingerprint(connection)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
 
@@ -10,6 +12,11 @@ class ItemCreate(ItemBase):
     pass
 
 
+# /items/bulk 의 row. URL 에 user_id 가 없으므로 row 마다 owner_id 를 받는다.
+class ItemBulkCreate(ItemCreate):
+    owner_id: int
+
+
 class Item(ItemBase):
     id: int
     owner_id: int
@@ -40,10 +47,31 @@ class UserCreate(UserBase):
     password: str
 
 
-class User(UserBase):
+# items 를 붙이지 않는 유저 응답. item 은 GET /users/{user_id}/items 로 페이지 단위로 읽는다.
+class UserSummary(UserBase):
     id: int
     is_active: bool
+
+    class Config:
+        orm_mode = True
+
+
+class User(UserSummary):
     items: list[Item] = []
 
     class Config:
         orm_mode = True
+
+
+# Bulk 생성 결과. 입력 row 순서 (index) 별로 성공 / 실패를 알려준다.
+class BulkRowResult(BaseModel):
+    index: int
+    status: Literal["created", "error"]
+    id: int | None = None
+    detail: str | list | None = None
+
+
+class BulkCreateResult(BaseModel):
+    created: int
+    failed: int
+    results: list[BulkRowResult]
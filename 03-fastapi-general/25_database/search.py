@@ -0,0 +1,116 @@
+import re
+
+from sqlalchemy import Connection, func, literal_column, select, table, column, text, or_, and_
+from sqlalchemy.sql import Select
+
+from models import Item
+
+# <Item 전문 검색 (full-text search) 인덱스>
+# - description 의 B-tree 인덱스는 "정확히 같은 값" / prefix 검색에만 쓰인다. 부분 문자열 / 키워드 검색 (LIKE '%...%') 은 결국 전체 스캔이다.
+# - SQLite: FTS5 가상 테이블 (items_fts). trigram tokenizer 라서 3글자 이상의 부분 문자열 검색도 인덱스로 찾는다.
+#   items 를 원본 (external content) 으로 쓰고 INSERT / UPDATE / DELETE 트리거로 동기화한다. (create_item, bulk insert 모두)
+# - Postgres: title + description 으로 만든 문서에 대해
+#   - tsvector GIN 인덱스: 키워드 검색 + ts_rank 랭킹
+#   - pg_trgm GIN 인덱스: 부분 문자열 (ILIKE '%...%') 검색 + similarity 랭킹
+#   식 (expression) 인덱스라서 INSERT 할 때 DB 가 알아서 갱신한다.
+# - 이미 있는 DB 에도 붙일 수 있도록 없을 때만 만든다. (replica 는 primary 에서 복제된 인덱스가 이미 있으므로 DDL 이 나가지 않는다)
+
+FTS_TABLE = "items_fts"
+# FTS5 trigram tokenizer 는 3글자보다 짧은 검색어를 인덱스로 찾지 못한다.
+MIN_TERM_LENGTH = 3
+
+SQLITE_SEARCH_DDL = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "title, description, content='items', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER items_fts_ai AFTER INSERT ON items BEGIN"
+    f" INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    f"CREATE TRIGGER items_fts_ad AFTER DELETE ON items BEGIN"
+    f" INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)"
+    f" VALUES ('delete', old.id, old.title, old.description); END",
+    f"CREATE TRIGGER items_fts_au AFTER UPDATE ON items BEGIN"
+    f" INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)"
+    f" VALUES ('delete', old.id, old.title, old.description);"
+    f" INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    # 인덱스를 만들기 전에 들어있던 row 들을 한 번에 색인한다.
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+# 검색 대상 문서 = title + ' ' + description. Postgres 식 인덱스와 쿼리의 식이 같아야 인덱스를 쓴다.
+DOCUMENT_SQL = "(coalesce({table}title, '') || ' ' || coalesce({table}description, ''))"
+_INDEXED_DOCUMENT = DOCUMENT_SQL.format(table="")
+# text search config 도 bind parameter 가 아니라 인덱스와 같은 상수여야 planner 가 식 인덱스를 고른다.
+TS_CONFIG = "'simple'::regconfig"
+POSTGRES_SEARCH_DDL = {
+    "ix_items_search_tsv":
+        f"CREATE INDEX ix_items_search_tsv ON items USING gin (to_tsvector({TS_CONFIG}, {_INDEXED_DOCUMENT}))",
+    "ix_items_search_trgm":
+        f"CREATE INDEX ix_items_search_trgm ON items USING gin ({_INDEXED_DOCUMENT} gin_trgm_ops)",
+}
+
+
+def install_search_index(connection: Connection) -> None:
+    # lifespan 에서 create_all 다음에 run_sync 로 호출한다.
+    # description 에 걸려 있던 B-tree 인덱스는 검색에 쓰이지 않고 쓰기 비용만 늘리므로 지운다.
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": FTS_TABLE}).first()
+        if not exists:
+            connection.execute(text("DROP INDEX IF EXISTS ix_items_description"))
+            for statement in SQLITE_SEARCH_DDL:
+                connection.execute(text(statement))
+    elif dialect == "postgresql":
+        existing = set(connection.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = 'items'")).scalars())
+        missing = [name for name in POSTGRES_SEARCH_DDL if name not in existing]
+        if missing:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            connection.execute(text("DROP INDEX IF EXISTS ix_items_description"))
+            for name in missing:
+                connection.execute(text(POSTGRES_SEARCH_DDL[name]))
+
+
+def search_terms(q: str) -> list[str]:
+    # 공백으로 나눈 키워드들. 모든 키워드를 (부분 문자열로) 포함하는 item 을 찾는다.
+    return [term for term in re.split(r"\s+", q.strip()) if term]
+
+
+# <검색 쿼리>
+# - (id, score) 를 만들어 주는 select 를 리턴한다. score 는 클수록 관련도가 높다.
+#   crud.search_items 에서 items 와 join 해서 score DESC, id ASC 로 정렬하고 cursor 로 자른다.
+# - SQLite: bm25 는 작을수록 관련도가 높으므로 부호를 뒤집는다.
+#   3글자보다 짧은 키워드는 trigram 인덱스로 찾을 수 없으므로, 인덱스로 좁힌 결과에 LIKE 조건으로 붙인다.
+#   (키워드가 모두 짧으면 인덱스 없이 LIKE 로 찾는다)
+# - Postgres: 키워드 랭킹 (ts_rank) + 부분 문자열 유사도 (similarity) 의 합
+def search_scores(dialect: str, q: str) -> Select:
+    terms = search_terms(q)
+    if not terms:
+        raise ValueError("Search query has no terms")
+    document = literal_column(DOCUMENT_SQL.format(table='items.'))
+    substring_matches = [document.ilike(f"%{_escape_like(term)}%", escape="\\") for term in terms]
+
+    if dialect == "sqlite":
+        indexed_terms = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+        short_term_matches = [match for term, match in zip(terms, substring_matches) if len(term) < MIN_TERM_LENGTH]
+        if indexed_terms:
+            fts = table(FTS_TABLE, column("rowid"))
+            # 각 키워드를 FTS5 문자열 (phrase) 로 감싸서 사용자 입력이 FTS5 문법으로 해석되지 않게 한다.
+            match = " ".join('"' + term.replace('"', '""') + '"' for term in indexed_terms)
+            query = (select(fts.c.rowid.label("id"), (-func.bm25(literal_column(FTS_TABLE))).label("score"))
+                     .select_from(fts)
+                     .where(literal_column(FTS_TABLE).op("MATCH")(match)))
+            if short_term_matches:
+                query = query.join(Item.__table__, Item.id == fts.c.rowid).where(*short_term_matches)
+            return query
+
+    elif dialect == "postgresql":
+        vector = func.to_tsvector(literal_column(TS_CONFIG), document)
+        tsquery = func.plainto_tsquery(literal_column(TS_CONFIG), q)
+        score = func.ts_rank(vector, tsquery) + func.similarity(document, q)
+        return select(Item.id.label("id"), score.label("score")).where(or_(vector.op("@@")(tsquery),
+                                                                           and_(*substring_matches)))
+
+    # 인덱스를 쓸 수 없는 경우: LIKE 로 찾는다. 랭킹은 없다.
+    return select(Item.id.label("id"), literal_column("0.0").label("score")).where(*substring_matches)
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
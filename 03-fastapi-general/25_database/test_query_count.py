@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+# database 모듈은 import 할 때 engine 을 만들므로 URL 을 먼저 정한다. (테스트마다 비어 있는 임시 SQLite 파일)
+os.environ["SQLALCHEMY_DB_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test_query_count.db"
+os.environ.pop("DB_REPLICA_URLS", None)
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from database import engine  # noqa: E402
+from query_counter import assert_max_queries  # noqa: E402
+
+# <N+1 회귀 테스트>
+# - 유저 N 명 + 유저마다 item 여러 개를 넣고, 목록 / 단건 조회가 데이터 양과 상관없이 정해진 쿼리 수 안에서 끝나는지 확인한다.
+# - 관계를 row 마다 lazy load 하게 바뀌면 쿼리 수가 유저 수만큼 늘어나서 실패한다.
+# 실행: python -m pytest test_query_count.py
+USERS = 30
+ITEMS_PER_USER = 3
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        for index in range(USERS):
+            user = client.post("/users/", json={"email": f"user-{index}@example.com", "password": "secret"}).json()
+            for item_index in range(ITEMS_PER_USER):
+                client.post(f"/users/{user['id']}/items/", json={"title": f"item {index}-{item_index}"})
+        yield client
+
+
+def test_list_users_with_items(client):
+    # 유저 목록 1번 + 유저들의 item 을 IN (...) 으로 한 번에 1번
+    with assert_max_queries(engine, 2):
+        response = client.get("/users/?limit=100")
+    users = response.json()
+    assert len(users) == USERS
+    assert all(len(user["items"]) == ITEMS_PER_USER for user in users)
+
+
+def test_list_users_with_capped_items(client):
+    with assert_max_queries(engine, 2):
+        response = client.get("/users/?limit=100&items_limit=1")
+    assert all(len(user["items"]) == 1 for user in response.json())
+
+
+def test_list_items(client):
+    with assert_max_queries(engine, 1):
+        response = client.get("/items/?limit=100")
+    assert len(response.json()) == USERS * ITEMS_PER_USER
@@ -0,0 +1,46 @@
+import asyncio
+import os
+import tempfile
+
+# database 모듈은 import 할 때 engine 을 만든다. 이 테스트는 자기 engine 을 따로 쓴다.
+os.environ.setdefault("SQLALCHEMY_DB_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test_row_counts.db")
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker  # noqa: E402
+
+import row_counts  # noqa: E402
+from models import User  # noqa: E402
+from row_counts import increment_row_count, get_row_count  # noqa: E402
+from schema_init import init_schema  # noqa: E402
+
+# <Row count shard 테스트>
+# - ROW_COUNT_SHARDS 를 늘려서 다시 시작해도 (fingerprint 모드) 새 shard 들이 만들어져서 카운터가 실제 row 수와 같아야 한다.
+# 실행: python -m pytest test_row_counts.py
+
+
+def test_row_count_shards_increase(monkeypatch):
+    async def run() -> int:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/row_counts.db")
+        session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+        async def start_and_insert(start: int, stop: int) -> None:
+            async with engine.begin() as connection:
+                await connection.run_sync(init_schema, "fingerprint")
+            for user_id in range(start, stop):
+                async with session_factory() as db:
+                    await db.execute(insert(User).values(id=user_id, email=f"user-{user_id}@example.com",
+                                                         hashed_password="x"))
+                    await increment_row_count(db, User)
+                    await db.commit()
+
+        monkeypatch.setattr(row_counts, "ROW_COUNT_SHARDS", 4)
+        await start_and_insert(1, 41)
+        monkeypatch.setattr(row_counts, "ROW_COUNT_SHARDS", 16)
+        await start_and_insert(41, 81)
+
+        async with session_factory() as db:
+            counted = await get_row_count(db, User)
+        await engine.dispose()
+        return counted
+
+    assert asyncio.run(run()) == 80
@@ -0,0 +1,200 @@
+import json
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud import get_user, get_user_by_email
+
+# 캐시에 "없음" 을 저장했을 때와 캐시에 아예 엔트리가 없을 때를 구분하기 위한 값
+MISSING = object()
+
+
+class CacheBackend:
+    # 값은 JSON 으로 표현 가능한 값 (dict / int / None) 만 쓴다. None 은 "DB 에 없음" (negative entry) 이다.
+    async def get(self, key: str) -> Any:
+        # 엔트리가 없거나 만료됐으면 MISSING
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    def size(self) -> int | None:
+        return None
+
+
+# <In-process backend>
+# - 워커 프로세스 하나 안에서만 쓰는 TTL + LRU dict. DB 왕복 없이 바로 돌려준다.
+# - 모든 호출이 event loop 한 스레드에서 일어나므로 lock 은 필요 없다.
+# - 워커가 여러 개면 다른 워커에서 생긴 변경은 TTL 이 지나야 보인다. 워커 간에 바로 무효화해야 하면 shared backend 를 쓴다.
+class InMemoryCacheBackend(CacheBackend):
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        # key -> (expires_at, value)
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.evicted = 0
+
+    async def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+# <Shared backend (Redis)>
+# - 여러 워커 / 여러 서버가 같은 캐시를 본다. 한 워커에서 무효화하면 다른 워커에도 바로 반영된다.
+# - 값은 JSON 으로 저장하고, TTL 은 Redis 의 EX 로 건다. LRU 제한은 Redis 의 maxmemory-policy (allkeys-lru) 에 맡긴다.
+# - client 는 redis.asyncio.Redis 처럼 get / set(ex=) / delete 를 지원하면 된다.
+class RedisCacheBackend(CacheBackend):
+    def __init__(self, client, prefix: str = "user-cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Any:
+        raw = await self.client.get(self.prefix + key)
+        if raw is None:
+            return MISSING
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        await self.client.set(self.prefix + key, json.dumps(value, separators=(",", ":")),
+                              ex=max(1, round(ttl_seconds)))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*[self.prefix + key for key in keys])
+
+
+# <User read-through cache>
+# - get_user / get_user_by_email 앞에 두는 캐시. 캐시에 없을 때만 DB 를 조회하고 결과를 캐시에 넣는다.
+# - 키
+#   - "user:<id>"      -> 응답 스키마 (User, items 포함) 의 dict. 없는 유저면 None
+#   - "email:<email>"  -> user id. 없는 email 이면 None
+#   email 로 찾은 결과도 "user:<id>" 엔트리를 같이 쓰므로 무효화할 곳이 한 군데다.
+# - 없는 id / email 도 negative_ttl 동안 캐시한다. (없는 유저를 계속 조회해서 DB 를 두드리는 것을 막는다)
+#   negative 엔트리는 짧게 두고, 유저가 생성되면 바로 지운다.
+# - 무효화
+#   - 유저 생성: 그 id 와 email 의 (negative) 엔트리
+#   - item 생성: owner 의 "user:<id>" 엔트리 (응답에 items 가 포함되어 있기 때문)
+# - 엔트리 version
+#   - 무효화는 엔트리를 지우고 "version:<key>" 를 새 값으로 바꾼다. 엔트리는 채울 때의 version 과 같이 저장한다.
+#   - 무효화 전에 DB 를 읽기 시작한 요청이 무효화 뒤에 이전 값을 채워 넣어도, version 이 달라서 읽을 때 miss 로 처리된다.
+#   - version 엔트리는 ttl_seconds 동안 둔다. 그보다 먼저 채워진 엔트리는 그 사이 만료된다.
+# - session 에 따라 다르게 동작한다. (main.get_read_db 참고)
+#   - read-your-writes 기간인 클라이언트: 캐시를 읽지 않고 primary 에서 읽는다. (다른 클라이언트가 채운 이전 값을 보지 않도록)
+#   - replica 세션: 캐시는 읽지만 miss 일 때 replica 에서 읽은 값은 채우지 않는다. (replica 가 늦으면 이전 값이 TTL 동안 남는다)
+class UserCache:
+    def __init__(self, backend: CacheBackend, ttl_seconds: float = 60, negative_ttl_seconds: float = 5):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.stale = 0
+        self.invalidations = 0
+
+    async def _version(self, key: str) -> str | None:
+        version = await self.backend.get(f"version:{key}")
+        return None if version is MISSING else version
+
+    async def _lookup(self, key: str) -> tuple[Any, str | None]:
+        # (캐시된 값 또는 MISSING, 지금 version) 을 돌려준다. 값을 채울 때는 여기서 받은 version 을 같이 넘긴다.
+        version = await self._version(key)
+        entry = await self.backend.get(key)
+        if entry is not MISSING and entry[0] != version:
+            self.stale += 1
+            entry = MISSING
+        if entry is MISSING:
+            self.misses += 1
+            return MISSING, version
+        value = entry[1]
+        if value is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return value, version
+
+    async def _store(self, db: AsyncSession, key: str, value: Any, version: str | None) -> None:
+        if db.info.get("replica"):
+            return
+        ttl_seconds = self.ttl_seconds if value is not None else self.negative_ttl_seconds
+        await self.backend.set(key, [version, value], ttl_seconds)
+
+    async def _get(self, db: AsyncSession, key: str) -> tuple[Any, str | None]:
+        if db.info.get("read_your_writes"):
+            self.bypasses += 1
+            return MISSING, await self._version(key)
+        return await self._lookup(key)
+
+    async def get_user(self, db: AsyncSession, user_id: int, load_for: type[BaseModel]) -> BaseModel | None:
+        key = f"user:{user_id}"
+        cached, version = await self._get(db, key)
+        if cached is not MISSING:
+            return load_for.model_validate(cached) if cached is not None else None
+
+        db_user = await get_user(db, user_id, load_for=load_for)
+        await self._store(db, key, db_user.model_dump(mode="json") if db_user else None, version)
+        return db_user
+
+    async def get_user_by_email(self, db: AsyncSession, email: str, load_for: type[BaseModel]) -> BaseModel | None:
+        key = f"email:{email}"
+        user_id, version = await self._get(db, key)
+        if user_id is MISSING:
+            db_user = await get_user_by_email(db, email)
+            user_id = db_user.id if db_user else None
+            await self._store(db, key, user_id, version)
+        if user_id is None:
+            return None
+        return await self.get_user(db, user_id, load_for)
+
+    async def invalidate_users(self, user_ids=(), emails=()) -> None:
+        keys = [f"user:{user_id}" for user_id in user_ids] + [f"email:{email}" for email in emails]
+        if keys:
+            self.invalidations += 1
+            version = secrets.token_hex(8)
+            for key in keys:
+                await self.backend.set(f"version:{key}", version, self.ttl_seconds)
+            await self.backend.delete(*keys)
+
+    def stats(self) -> dict[str, int | float | None]:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "stale": self.stale,
+            "hit_ratio": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evicted": getattr(self.backend, "evicted", None),
+        }
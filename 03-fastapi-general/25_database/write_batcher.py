@@ -0,0 +1,145 @@
+import asyncio
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from crud import create_item
+from models import Item
+from row_counts import increment_row_count
+from schemas import ItemCreate
+
+
+# <Group commit (write coalescing)>
+# - create_item 은 요청마다 트랜잭션을 commit 한다. 동시에 쓰는 요청이 많으면 commit (fsync) 비용이 지연시간의 대부분이 된다.
+# - submit() 으로 들어온 item 들을 최대 window_seconds 동안 (또는 max_batch_size 개가 찰 때까지) 모아서
+#   multi-row INSERT ... RETURNING 한 번 + commit 한 번으로 쓴다. 각 요청은 자기 row (id 포함) 를 받는다.
+# - batch 는 한 번에 하나씩만 쓴다. 앞 batch 가 commit 하는 동안 들어온 요청은 다음 batch 로 모인다.
+# - batch 중 한 row 라도 실패하면 (e.g. 제약조건 위반) batch 전체를 rollback 하고 row 마다 따로 다시 쓴다.
+#   실패한 row 의 요청만 자기 에러를 받고 나머지는 정상적으로 저장된다.
+class ItemWriteBatcher:
+    def __init__(self, session_factory: async_sessionmaker, window_seconds: float = 0.002, max_batch_size: int = 128):
+        self.session_factory = session_factory
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._pending: list[tuple[ItemCreate, int, asyncio.Future]] = []
+        self._has_pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._closing = False
+
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+        self.largest_batch = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        # 남은 요청을 모두 쓰고 멈춘다.
+        # 여기서 직접 쓰면 _run 이 쓰고 있는 batch 와 동시에 쓰게 되므로, _run 에 멈추라고 알리고 남은 batch 도 _run 이 쓰게 한다.
+        # (cancel 하면 쓰고 있던 batch 의 요청들이 결과를 받지 못한다)
+        if self._task is None:
+            return
+        self._closing = True
+        self._has_pending.set()
+        await self._task
+        self._task = None
+        self._closing = False
+
+    async def submit(self, item: ItemCreate, owner_id: int) -> Item:
+        # 쓰는 task 가 없으면 future 를 채워줄 곳이 없어서 요청이 영원히 기다리게 된다.
+        if self._task is None or self._task.done():
+            raise RuntimeError("Item write batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, owner_id, future))
+        self._has_pending.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        return await future
+
+    def _take_batch(self) -> list[tuple[ItemCreate, int, asyncio.Future]]:
+        batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        if not self._pending:
+            self._has_pending.clear()
+        if len(self._pending) < self.max_batch_size:
+            self._full.clear()
+        return batch
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                if self._closing and not self._pending:
+                    return
+                await self._has_pending.wait()
+                # 닫는 중이면 window 를 기다리지 않고 바로 쓴다.
+                if not self._full.is_set() and not self._closing:
+                    try:
+                        await asyncio.wait_for(self._full.wait(), self.window_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                batch = self._take_batch()
+                try:
+                    await self._write(batch)
+                except Exception as error:
+                    # 세션 생성 / rollback 실패처럼 _write 가 처리하지 못한 에러. 이 batch 의 요청들에 에러를 주고 계속 돈다.
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(error)
+        finally:
+            # task 가 취소되는 등으로 끝나면 남은 요청이 영원히 기다리지 않도록 에러를 준다.
+            pending, self._pending = self._pending, []
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(RuntimeError("Item write batcher stopped"))
+
+    async def _write(self, batch: list[tuple[ItemCreate, int, asyncio.Future]]) -> None:
+        # 기다리다가 취소된 요청 (클라이언트 연결 끊김 등) 은 쓰지 않는다.
+        batch = [entry for entry in batch if not entry[2].done()]
+        if not batch:
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        rows = [{**item.model_dump(), "owner_id": owner_id} for item, owner_id, _ in batch]
+        async with self.session_factory() as db:
+            try:
+                # sort_by_parameter_order=True: RETURNING 결과가 입력 순서와 같다. -> i 번째 row 를 i 번째 요청에 돌려준다.
+                created = (await db.scalars(insert(Item).returning(Item, sort_by_parameter_order=True), rows)).all()
+                await increment_row_count(db, Item, len(created))
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                created = None
+
+        if created is not None:
+            for (_, _, future), db_item in zip(batch, created):
+                if not future.done():
+                    future.set_result(db_item)
+            return
+
+        # batch 전체가 실패했다. 어떤 row 가 문제인지 알 수 없으므로 row 마다 따로 써서 결과를 나눠준다.
+        # (rollback 은 세션의 모든 객체를 expire 시키므로 row 마다 새 세션을 쓴다)
+        self.fallbacks += 1
+        for item, owner_id, future in batch:
+            async with self.session_factory() as db:
+                try:
+                    db_item = await create_item(db, item, owner_id)
+                except Exception as error:
+                    if not future.done():
+                        future.set_exception(error)
+                else:
+                    if not future.done():
+                        future.set_result(db_item)
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch_size": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "fallbacks": self.fallbacks,
+            "pending": len(self._pending),
+        }